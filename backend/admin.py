@@ -1,6 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, FacialAnalysis, WeeklySummary
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from . import events
+from .inference import analyze_faces
+from .models import User, Recommendation, FacialAnalysis, WeeklySummary
+from .pagination import EstimatedCountPaginator
+from .storage import iter_local_batches
 
 
 @admin.register(User)
@@ -25,21 +30,101 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+@admin.register(Recommendation)
+class RecommendationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'text']
+    search_fields = ['text']
+
+    # Stored results reference rows by ID, so the catalog is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class UserEmailPrefixSearchMixin:
+    """
+    Search by email prefix through the users table
+
+    Matching users are looked up on the indexed email column first, then
+    rows are filtered by user_id, instead of a LIKE scan over the join.
+    """
+    search_fields = ['^user__email']
+    search_help_text = 'Search by the beginning of the user\'s email'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        users = User.objects.filter(email__istartswith=search_term).values('pk')
+        return queryset.filter(user__in=users), False
+
+
 @admin.register(FacialAnalysis)
-class FacialAnalysisAdmin(admin.ModelAdmin):
-    list_display = ['user', 'created_at', 'has_result']
-    list_filter = ['created_at']
-    search_fields = ['user__email']
+class FacialAnalysisAdmin(UserEmailPrefixSearchMixin, admin.ModelAdmin):
+    list_display = ['user', 'created_at', 'has_result', 'is_archived']
+    list_filter = ['is_archived']
+    list_select_related = ['user']
+    date_hierarchy = 'created_at'
     readonly_fields = ['created_at']
-    
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['reanalyze', 'archive']
+    reanalyze_batch_size = 16
+
+    def get_queryset(self, request):
+        # The result JSON is only needed on the change form
+        return super().get_queryset(request).defer('analysis_result').annotate(
+            result_present=ExpressionWrapper(Q(analysis_result__isnull=False), output_field=BooleanField())
+        )
+
+    @admin.display(boolean=True, ordering='result_present')
     def has_result(self, obj):
-        return obj.analysis_result is not None
-    has_result.boolean = True
+        return obj.result_present
+
+    @admin.action(description='Re-analyze selected analyses')
+    def reanalyze(self, request, queryset):
+        analyses = queryset.select_related(None).only('id', 'user_id', 'image', 'face_box', 'created_at')
+        analyzed = 0
+        failed = 0
+        # Derived data is rebuilt once per user at the end
+        with events.coalesce():
+            # Images in remote storage for the next batch download while this one runs
+            for files, image_paths in iter_local_batches(
+                    [analysis.image for analysis in analyses], batch_size=self.reanalyze_batch_size):
+                batch = [f.instance for f in files]
+                results = analyze_faces(image_paths, [analysis.face_box for analysis in batch])
+                updated = []
+                for analysis, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        continue
+                    analysis.analysis_result = result
+                    updated.append(analysis)
+                FacialAnalysis.objects.bulk_update(updated, ['analysis_result'])
+                events.publish('updated', updated)
+                analyzed += len(updated)
+
+        self.message_user(request, f'Re-analyzed {analyzed} analyses.', messages.SUCCESS)
+        if failed:
+            self.message_user(request, f'{failed} analyses could not be re-analyzed.', messages.WARNING)
+
+    @admin.action(description='Archive selected analyses')
+    def archive(self, request, queryset):
+        analyses = list(queryset.filter(is_archived=False).select_related(None).only('id', 'user_id', 'created_at'))
+        archived = FacialAnalysis.objects.filter(pk__in=[analysis.pk for analysis in analyses]).update(is_archived=True)
+        # QuerySet.update sends no signals
+        events.publish('updated', analyses)
+        self.message_user(request, f'Archived {archived} analyses.', messages.SUCCESS)
 
 
 @admin.register(WeeklySummary)
-class WeeklySummaryAdmin(admin.ModelAdmin):
+class WeeklySummaryAdmin(UserEmailPrefixSearchMixin, admin.ModelAdmin):
     list_display = ['user', 'week_start', 'week_end', 'total_analyses', 'created_at']
     list_filter = ['week_start', 'created_at']
-    search_fields = ['user__email']
-    readonly_fields = ['created_at']
+    list_select_related = ['user']
+    readonly_fields = ['created_at', 'updated_at']
+    date_hierarchy = 'week_start'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
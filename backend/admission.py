@@ -0,0 +1,175 @@
+"""
+Admission control for the analysis endpoints
+
+Inference is admitted through a process-wide controller with a bounded
+number of in-flight units (one per image). When it is saturated, requests
+wait in a bounded queue for a short time; instead of piling up until the
+worker times out they are shed with:
+
+- 429 + Retry-After when the user already has MAX_PER_USER requests running
+  or queued
+- 503 + Retry-After when the queue is full, the wait times out, or the
+  recent inference latency is above LATENCY_TARGET while requests are
+  already queued
+
+A batch larger than MAX_IN_FLIGHT takes all slots, so it runs alone but
+puts more than MAX_IN_FLIGHT images in flight. Limits apply per web worker
+process. Shed counts are exposed through metrics() for the admission
+metrics endpoint.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Analysis is temporarily overloaded, please retry later.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        # DRF's exception handler turns `wait` into a Retry-After header
+        self.wait = wait
+
+
+class AdmissionController:
+
+    def __init__(self, max_in_flight=4, max_queue=8, queue_timeout=5.0,
+                 max_per_user=2, latency_target=10.0, latency_alpha=0.2):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max_per_user
+        self.latency_target = latency_target
+        self.latency_alpha = latency_alpha
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._per_user = Counter()
+        self._latency = None
+        self._admitted = 0
+        self._shed = Counter()
+
+    def _retry_after(self):
+        latency = self._latency or 1.0
+        backlog = (self._waiting + self._in_flight) / self.max_in_flight
+        return max(1, math.ceil(latency * backlog))
+
+    def _shed_request(self, reason, user_id):
+        self._shed[reason] += 1
+        wait = self._retry_after()
+        logger.warning('Shedding analysis request (%s) for user %s, retry after %ss', reason, user_id, wait)
+        if reason == 'user_concurrency':
+            return Throttled(wait=wait, detail='Too many analyses in progress for this user.')
+        return ServiceOverloaded(wait=wait)
+
+    def _acquire(self, user_id, slots):
+        with self._condition:
+            if self._per_user[user_id] >= self.max_per_user:
+                raise self._shed_request('user_concurrency', user_id)
+
+            queued = self._in_flight + slots > self.max_in_flight
+            if queued:
+                if self._waiting >= self.max_queue:
+                    raise self._shed_request('queue_full', user_id)
+                if self._latency is not None and self._latency > self.latency_target and self._waiting:
+                    raise self._shed_request('latency', user_id)
+
+            # Queued requests count towards the user's limit too, so one
+            # user cannot fill the queue and then run all of it at once
+            self._per_user[user_id] += 1
+            if queued:
+                self._waiting += 1
+                admitted = False
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self._in_flight + slots <= self.max_in_flight,
+                        timeout=self.queue_timeout
+                    )
+                finally:
+                    self._waiting -= 1
+                    if not admitted:
+                        self._leave(user_id)
+                if not admitted:
+                    raise self._shed_request('queue_timeout', user_id)
+
+            self._in_flight += slots
+            self._admitted += 1
+
+    def _leave(self, user_id):
+        self._per_user[user_id] -= 1
+        if not self._per_user[user_id]:
+            del self._per_user[user_id]
+
+    def _release(self, user_id, slots, units, elapsed):
+        with self._condition:
+            self._in_flight -= slots
+            self._leave(user_id)
+            # Average over the images actually analyzed, not the slots held
+            per_unit = elapsed / units
+            if self._latency is None:
+                self._latency = per_unit
+            else:
+                self._latency += self.latency_alpha * (per_unit - self._latency)
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, user_id, units=1):
+        """
+        Hold one inference slot per image (`units`) for the duration of the block
+
+        Batches larger than max_in_flight hold every slot. Raises Throttled
+        (429) or ServiceOverloaded (503) when shed.
+        """
+        units = max(1, units)
+        slots = min(units, self.max_in_flight)
+        self._acquire(user_id, slots)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(user_id, slots, units, time.monotonic() - start)
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'latency_ewma_seconds': round(self._latency, 4) if self._latency is not None else None,
+                'admitted': self._admitted,
+                'shed': dict(self._shed),
+            }
+
+
+_controller = None
+
+
+def get_controller():
+    global _controller
+    if _controller is None:
+        options = getattr(settings, 'MASKLENS_ADMISSION', {})
+        _controller = AdmissionController(**{key.lower(): value for key, value in options.items()})
+    return _controller
+
+
+@receiver(setting_changed)
+def _reset_controller(setting, **kwargs):
+    global _controller
+    if setting == 'MASKLENS_ADMISSION':
+        _controller = None
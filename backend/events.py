@@ -0,0 +1,217 @@
+"""
+Derived data updates on analysis changes
+
+FacialAnalysis saves and deletes (post_save / post_delete, or publish()
+for bulk_create, bulk_update and QuerySet.update, which send no signals)
+are collected per user and handed to the registered updaters once the
+transaction commits (transaction.on_commit):
+
+- trend rollups: new analyses are added incrementally, any update or
+  delete rebuilds the user's rollups
+- weekly summaries of the touched weeks
+- cached list responses (see response_cache.py)
+
+Inside a `coalesce()` block nothing is dispatched until the block exits,
+so a bulk upload or admin action updates each user's derived data once
+instead of once per image. An analysis created and deleted in the same
+block (a failed upload) cancels out. With MASKLENS_EVENTS['DEBOUNCE'] set,
+committed changes also wait that many seconds for more changes for the
+same user and are then dispatched from a background thread; changes
+still pending are dispatched when the process exits (atexit).
+"""
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import response_cache, trends
+from .models import FacialAnalysis, User
+from .summaries import update_weekly_summary, week_start_for
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserChanges:
+    """Coalesced changes to one user's analyses"""
+
+    def __init__(self):
+        self.created = {}
+        self.rebuild = False
+        self.days = set()
+
+    def add(self, kind, analysis):
+        if analysis.created_at is not None:
+            self.days.add(timezone.localdate(analysis.created_at))
+        if kind == 'created' or (kind == 'updated' and analysis.pk in self.created):
+            self.created[analysis.pk] = analysis
+        elif kind == 'deleted' and analysis.pk in self.created:
+            del self.created[analysis.pk]
+        else:
+            self.rebuild = True
+
+    def merge(self, other):
+        self.created.update(other.created)
+        self.rebuild = self.rebuild or other.rebuild
+        self.days |= other.days
+
+
+class EventBus:
+
+    def __init__(self, debounce=0.0):
+        self.debounce = debounce
+        self.updaters = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def register(self, updater):
+        """Add an updater(user_id, changes); usable as a decorator"""
+        self.updaters.append(updater)
+        return updater
+
+    def _buffer(self):
+        if not hasattr(self._local, 'depth'):
+            self._local.depth = 0
+            self._local.changes = {}
+        return self._local
+
+    def publish(self, kind, analyses):
+        """Record 'created', 'updated' or 'deleted' analyses"""
+        local = self._buffer()
+        changes = {} if local.depth == 0 else local.changes
+        for analysis in analyses:
+            changes.setdefault(analysis.user_id, UserChanges()).add(kind, analysis)
+        if local.depth == 0 and changes:
+            transaction.on_commit(partial(self._committed, changes))
+
+    @contextmanager
+    def coalesce(self):
+        local = self._buffer()
+        local.depth += 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                changes, local.changes = local.changes, {}
+                # Changes already saved in autocommit mode are committed
+                # even if the block raised
+                if changes:
+                    transaction.on_commit(partial(self._committed, changes))
+
+    def _committed(self, changes):
+        if not self.debounce:
+            self.dispatch(changes)
+            return
+        with self._lock:
+            for user_id, user_changes in changes.items():
+                if user_id in self._pending:
+                    self._pending[user_id].merge(user_changes)
+                else:
+                    self._pending[user_id] = user_changes
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self._flush_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _take_pending(self):
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return changes
+
+    def _flush_pending(self):
+        try:
+            self.dispatch(self._take_pending())
+        finally:
+            # The timer thread's (or exit handler's) database connection is
+            # not managed by a request
+            connections.close_all()
+
+    def flush(self):
+        """Dispatch debounced changes now (e.g. before shutdown)"""
+        self.dispatch(self._take_pending())
+
+    def dispatch(self, changes):
+        for user_id, user_changes in changes.items():
+            for updater in self.updaters:
+                try:
+                    updater(user_id, user_changes)
+                except Exception:
+                    # Derived data can be rebuilt; never fail the write for it
+                    logger.exception('Derived data updater %s failed for user %s', updater.__name__, user_id)
+
+
+bus = EventBus(getattr(settings, 'MASKLENS_EVENTS', {}).get('DEBOUNCE', 0.0))
+# Not run when the process is killed; rebuild_weekly_summaries and
+# rebuild_trend_rollups repair what is lost then
+atexit.register(bus._flush_pending)
+
+
+def publish(kind, analyses):
+    bus.publish(kind, analyses)
+
+
+def coalesce():
+    return bus.coalesce()
+
+
+@receiver(setting_changed)
+def _update_debounce(setting, **kwargs):
+    if setting == 'MASKLENS_EVENTS':
+        bus.flush()
+        bus.debounce = getattr(settings, 'MASKLENS_EVENTS', {}).get('DEBOUNCE', 0.0)
+
+
+@receiver(post_save, sender=FacialAnalysis)
+def _analysis_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        publish('created' if created else 'updated', [instance])
+
+
+@receiver(post_delete, sender=FacialAnalysis)
+def _analysis_deleted(sender, instance, **kwargs):
+    publish('deleted', [instance])
+
+
+# Updaters
+
+def _get_user(user_id):
+    # None when the user itself is being deleted
+    return User.objects.filter(pk=user_id).first()
+
+
+@bus.register
+def update_trend_rollups(user_id, changes):
+    if changes.rebuild:
+        user = _get_user(user_id)
+        if user is not None:
+            trends.rebuild_rollups(user)
+    elif changes.created:
+        trends.record_analyses(changes.created.values())
+
+
+@bus.register
+def update_weekly_summaries(user_id, changes):
+    user = _get_user(user_id)
+    if user is None:
+        return
+    for week_start in sorted({week_start_for(day) for day in changes.days}):
+        update_weekly_summary(user, week_start)
+
+
+@bus.register
+def invalidate_list_caches(user_id, changes):
+    response_cache.invalidate(user_id, 'analyses', 'summaries')
@@ -0,0 +1,130 @@
+"""
+Streaming exports of a user's analysis history
+
+Every generator here reads the queryset with iterator() and yields small
+byte chunks, so memory use does not depend on the size of the history and
+the first bytes are sent as soon as the first rows are fetched.
+"""
+import csv
+import zipfile
+from io import BytesIO
+
+from .fields import METRIC_CODES
+from .models import FacialAnalysis
+from .renderers import FastJSONRenderer
+from .serializers import FacialAnalysisListSerializer
+
+
+CSV_COLUMNS = (
+    ['id', 'created_at', 'image', 'overall_score', 'confidence']
+    + list(METRIC_CODES)
+    + ['recommendations']
+)
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+class _Echo:
+    """File-like object that hands back whatever is written to it"""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkBuffer:
+    """Unseekable sink for ZipFile that collects written bytes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_ndjson(queryset, context):
+    renderer = FastJSONRenderer()
+    for item in FacialAnalysisListSerializer(queryset, context=context).iter_data():
+        yield renderer.render(item) + b'\n'
+
+
+def _csv_row(item):
+    result = item['analysis_result'] or {}
+    skin_health = result.get('skin_health', {})
+    return (
+        [
+            item['id'],
+            item['created_at'],
+            item['image'],
+            result.get('overall_score', ''),
+            result.get('confidence', ''),
+        ]
+        + [skin_health.get(metric, '') for metric in METRIC_CODES]
+        + ['; '.join(result.get('recommendations', []))]
+    )
+
+
+def iter_csv(queryset, context):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS).encode()
+    for item in FacialAnalysisListSerializer(queryset, context=context).iter_data():
+        yield writer.writerow(_csv_row(item)).encode()
+
+
+def _thumbnail(image_field):
+    from PIL import Image, ImageOps
+
+    with image_field.open('rb') as f:
+        img = Image.open(f)
+        # Decode JPEGs at a reduced scale before rotating by the EXIF orientation
+        img.draft('RGB', THUMBNAIL_SIZE)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(THUMBNAIL_SIZE)
+        buffer = BytesIO()
+        img.convert('RGB').save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def iter_zip(queryset, context, export_format):
+    """
+    Stream a zip holding the export file plus a JPEG thumbnail per analysis
+
+    Entries are written with data descriptors, so nothing has to be
+    seeked back to and each chunk can be sent as soon as it is compressed.
+    """
+    sink = _ChunkBuffer()
+    rows = iter_ndjson if export_format == 'ndjson' else iter_csv
+
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(f'analyses.{export_format}', mode='w', force_zip64=True) as entry:
+            for chunk in rows(queryset, context):
+                entry.write(chunk)
+                yield sink.drain()
+
+        analyses = queryset.only('id', 'image').iterator(chunk_size=200)
+        for analysis in analyses:
+            if not analysis.image:
+                continue
+            try:
+                data = _thumbnail(analysis.image)
+            except (OSError, ValueError):
+                # Missing or unreadable file - the export row still references it
+                continue
+            info = zipfile.ZipInfo(f'thumbnails/{analysis.pk}.jpg')
+            info.compress_type = zipfile.ZIP_STORED
+            archive.writestr(info, data)
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+def export_queryset(user):
+    return FacialAnalysis.objects.filter(user=user, is_archived=False).order_by('created_at')
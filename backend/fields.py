@@ -0,0 +1,190 @@
+"""
+Compact storage for facial analysis results
+
+Every analysis result repeats the same metric names, severity levels and
+recommendation sentences. CompactAnalysisResultField keeps the Python/API
+shape of `analysis_result` unchanged but stores it in the database as:
+
+    {
+        "v": 1,
+        "m": [2, 17, 32, ...],   # (metric_code << 4) | level_code
+        "r": [3, 1, 8],          # Recommendation catalog IDs
+        "overall_score": 7.5,    # any other keys are kept as-is
+        ...
+    }
+
+Rows that were written before this field existed (or that contain metrics
+or levels without a code, or recommendations too long for the catalog)
+are stored and returned verbatim. The catalog is append-only; an ID that
+is missing from it anyway is dropped from the decoded result.
+"""
+import logging
+import threading
+from functools import partial
+
+from django.apps import apps
+from django.db import models, transaction
+
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Append only - the position of each entry is its stored code
+METRIC_CODES = (
+    'acne',
+    'dark_circles',
+    'wrinkles',
+    'hydration',
+    'redness',
+    'pores',
+)
+
+LEVEL_CODES = (
+    'low',
+    'medium',
+    'high',
+    'poor',
+    'fair',
+    'good',
+    'excellent',
+)
+
+_METRIC_INDEX = {name: code for code, name in enumerate(METRIC_CODES)}
+_LEVEL_INDEX = {name: code for code, name in enumerate(LEVEL_CODES)}
+
+
+class RecommendationCatalog:
+    """Process-local two-way cache of the Recommendation table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._texts = {}
+        self._missing = set()
+
+    def _model(self):
+        return apps.get_model('backend', 'Recommendation')
+
+    @property
+    def max_length(self):
+        return self._model()._meta.get_field('text').max_length
+
+    def _remember(self, pk, text):
+        self._ids[text] = pk
+        self._texts[pk] = text
+
+    def _remember_committed(self, pk, text):
+        with self._lock:
+            self._remember(pk, text)
+
+    def reload(self):
+        with self._lock:
+            self._ids.clear()
+            self._texts.clear()
+            self._missing.clear()
+            for pk, text in self._model().objects.values_list('id', 'text'):
+                self._remember(pk, text)
+
+    def get_id(self, text):
+        pk = self._ids.get(text)
+        if pk is None:
+            recommendation, _ = self._model().objects.get_or_create(text=text)
+            pk = recommendation.pk
+            # A row created in a transaction that rolls back is gone and its
+            # ID may be reused, so only cache it once it is committed
+            transaction.on_commit(
+                partial(self._remember_committed, pk, text),
+                using=recommendation._state.db,
+            )
+        return pk
+
+    def get_text(self, pk):
+        """Return the text for `pk`, or None if it is not in the catalog"""
+        text = self._texts.get(pk)
+        if text is None and pk not in self._missing:
+            # Another process may have added it since we last looked
+            self.reload()
+            text = self._texts.get(pk)
+            if text is None:
+                # Only reload once per missing ID
+                with self._lock:
+                    self._missing.add(pk)
+        return text
+
+
+catalog = RecommendationCatalog()
+
+
+def encode_analysis_result(result):
+    """Convert a full analysis result dict into its compact stored form"""
+    if not isinstance(result, dict) or 'v' in result:
+        return result
+
+    skin_health = result.get('skin_health', {})
+    recommendations = result.get('recommendations', [])
+    if not isinstance(skin_health, dict) or not isinstance(recommendations, list):
+        return result
+
+    metrics = []
+    for metric, level in skin_health.items():
+        if metric not in _METRIC_INDEX or level not in _LEVEL_INDEX:
+            return result
+        metrics.append((_METRIC_INDEX[metric] << 4) | _LEVEL_INDEX[level])
+
+    max_length = catalog.max_length
+    if not all(isinstance(text, str) and len(text) <= max_length for text in recommendations):
+        return result
+
+    compact = {
+        key: value for key, value in result.items()
+        if key not in ('skin_health', 'recommendations')
+    }
+    compact['v'] = FORMAT_VERSION
+    if 'skin_health' in result:
+        compact['m'] = metrics
+    if 'recommendations' in result:
+        compact['r'] = [catalog.get_id(text) for text in recommendations]
+    return compact
+
+
+def decode_analysis_result(stored):
+    """Convert a stored (compact or legacy) result back to the full dict"""
+    if not isinstance(stored, dict) or stored.get('v') != FORMAT_VERSION:
+        return stored
+
+    result = {}
+    if 'm' in stored:
+        result['skin_health'] = {
+            METRIC_CODES[code >> 4]: LEVEL_CODES[code & 0xF]
+            for code in stored['m']
+        }
+    if 'r' in stored:
+        texts = [catalog.get_text(pk) for pk in stored['r']]
+        if None in texts:
+            logger.warning(
+                'Skipping recommendation IDs missing from the catalog: %s',
+                [pk for pk, text in zip(stored['r'], texts) if text is None]
+            )
+            texts = [text for text in texts if text is not None]
+        result['recommendations'] = texts
+    for key, value in stored.items():
+        if key not in ('v', 'm', 'r'):
+            result[key] = value
+    return result
+
+
+class CompactAnalysisResultField(models.JSONField):
+    """JSONField that stores analysis results in the compact format"""
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        if expression is not None and getattr(expression, 'target', None) is not self:
+            # Key transforms and other expressions read raw stored values
+            return value
+        return decode_analysis_result(value)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, dict):
+            value = encode_analysis_result(value)
+        return super().get_db_prep_save(value, connection)
@@ -0,0 +1,135 @@
+"""
+Facial analysis entry points used by the views
+
+The backend is chosen with settings.MASKLENS_INFERENCE['BACKEND']:
+
+- 'auto' (default): backend/ml_model.py when it exists (see
+  ml_model_example.py), mock results otherwise
+- 'mock', 'ml_model': as above, explicitly
+- 'onnx', 'torchscript': run an exported model on the CPU, optionally the
+  int8 quantized copy, with explicit intra/inter-op thread counts
+- 'remote': preprocess in the web worker and run SERVER_BACKEND in the
+  shared inference server (see server.py)
+
+Before analysis, detect_faces finds the face box of each image with the
+FACE_DETECTOR (see detection.py) so images without a face can be rejected
+and the model only sees the face crop.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from ..recommendations import recommend
+from .backends import BACKENDS, MlModelBackend
+from .detection import NoFaceDetected, create_detector
+
+
+def mock_facial_analysis(image_path):
+    """Mock analysis result - used until backend/ml_model.py is added"""
+    skin_health = {
+        'acne': 'low',
+        'dark_circles': 'medium',
+        'wrinkles': 'low',
+        'hydration': 'good',
+        'redness': 'low',
+        'pores': 'medium'
+    }
+    return {
+        'skin_health': skin_health,
+        'recommendations': recommend(skin_health),
+        'overall_score': 7.5,
+        'confidence': 0.85
+    }
+
+
+_backend = None
+_detector = None
+
+
+def get_inference_options():
+    return dict(getattr(settings, 'MASKLENS_INFERENCE', {}))
+
+
+def create_backend(**overrides):
+    """Build a new backend from settings.MASKLENS_INFERENCE plus overrides"""
+    options = get_inference_options()
+    options.update(overrides)
+    name = options.pop('BACKEND', 'auto')
+    if name == 'auto':
+        name = 'ml_model' if MlModelBackend.is_available() else 'mock'
+    if name not in BACKENDS:
+        raise ImproperlyConfigured(f'Unknown inference backend: {name}')
+    return BACKENDS[name](**{key.lower(): value for key, value in options.items()})
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        options = get_inference_options()
+        _detector = create_detector(
+            options.get('FACE_DETECTOR', 'auto'),
+            margin=options.get('FACE_MARGIN', 0.2)
+        )
+    return _detector
+
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend, _detector
+    if setting == 'MASKLENS_INFERENCE':
+        _backend = None
+        _detector = None
+
+
+def detect_face(image):
+    """
+    Return the face box of an image path or file (None if detection is disabled)
+
+    Raises NoFaceDetected when there is no face in the image.
+    """
+    return get_detector().detect(image)
+
+
+def detect_faces(images):
+    """Return a face box or the exception raised, for each image in order"""
+    return get_detector().detect_many(list(images))
+
+
+def analyze_face(image_path, face_box=None):
+    """Analyze a single image; raises if the analysis fails"""
+    result = get_backend().analyze([image_path], [face_box])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def analyze_faces(image_paths, face_boxes=None):
+    """
+    Analyze several images as one batch
+
+    Returns a list with, for each path in order, either the result dict or
+    the exception raised while analyzing that image, so one bad image does
+    not fail the whole batch. A path may also be an exception (e.g. from a
+    failed download), which is returned as that image's result.
+    """
+    image_paths = list(image_paths)
+    if face_boxes is None:
+        face_boxes = [None] * len(image_paths)
+    results = list(image_paths)
+    indexes = [i for i, path in enumerate(image_paths) if not isinstance(path, Exception)]
+    if indexes:
+        analyzed = get_backend().analyze(
+            [image_paths[i] for i in indexes], [face_boxes[i] for i in indexes]
+        )
+        for i, result in zip(indexes, analyzed):
+            results[i] = result
+    return results
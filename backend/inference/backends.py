@@ -0,0 +1,246 @@
+"""
+Inference backends
+
+Every backend implements analyze(image_paths, face_boxes=None) and
+returns, for each path in order, either a result dict or the exception
+raised for that image. Model backends crop each image to its face box in
+memory; the ml_model backend receives the path of a temporary file
+holding the face crop. The mock backend never reads the pixels and
+ignores the boxes.
+Heavy libraries (numpy, onnxruntime, torch) are only imported when a
+model backend is first used.
+"""
+import importlib
+import importlib.util
+import os
+import time
+
+from ..recommendations import add_recommendations
+from .postprocessing import predictions_to_result
+from .preprocessing import face_crop_paths, load_image_array
+
+
+class InferenceBackend:
+    name = None
+
+    def __init__(self, **options):
+        pass
+
+    def analyze(self, image_paths, face_boxes=None):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Load anything expensive ahead of the first request"""
+
+
+class MockBackend(InferenceBackend):
+    """Returns the mock result for every image"""
+    name = 'mock'
+
+    def analyze(self, image_paths, face_boxes=None):
+        from . import mock_facial_analysis
+
+        return [mock_facial_analysis(path) for path in image_paths]
+
+
+class MlModelBackend(InferenceBackend):
+    """Wraps a user-provided backend/ml_model.py (see ml_model_example.py)"""
+    name = 'ml_model'
+    module_name = 'backend.ml_model'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._module = None
+
+    @classmethod
+    def is_available(cls):
+        return importlib.util.find_spec(cls.module_name) is not None
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.module_name)
+        return self._module
+
+    def warm_up(self):
+        self.module
+
+    def analyze(self, image_paths, face_boxes=None):
+        with face_crop_paths(image_paths, face_boxes) as paths:
+            results = list(paths)
+            indexes = [i for i, path in enumerate(paths) if not isinstance(path, Exception)]
+            for index, result in zip(indexes, self._analyze_paths([paths[i] for i in indexes])):
+                results[index] = result
+            return results
+
+    def _analyze_paths(self, image_paths):
+        module = self.module
+        if image_paths and hasattr(module, 'analyze_faces'):
+            try:
+                return list(module.analyze_faces(image_paths))
+            except Exception:
+                # Fall back to per-image calls to find out which image failed
+                pass
+
+        results = []
+        for image_path in image_paths:
+            try:
+                results.append(module.analyze_face(image_path))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class ModelBackend(InferenceBackend):
+    """
+    Base class for backends running an exported model file on the CPU
+
+    The model takes a float32 NCHW batch of normalized RGB images and
+    returns one row of scores in [0, 1] per image (see postprocessing).
+    """
+
+    def __init__(self, model_path, quantized_model_path=None, use_quantized=False,
+                 input_size=224, intra_op_threads=1, inter_op_threads=1, **options):
+        self.model_path = str(quantized_model_path if use_quantized else model_path)
+        self.input_size = input_size
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._model = None
+
+    def load_model(self):
+        raise NotImplementedError
+
+    def run(self, model, batch):
+        raise NotImplementedError
+
+    @property
+    def model(self):
+        if self._model is None:
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(f'Model file not found: {self.model_path}')
+            self._model = self.load_model()
+        return self._model
+
+    def warm_up(self):
+        self.model
+
+    def preprocess(self, image_path, face_box=None):
+        return load_image_array(image_path, self.input_size, face_box)
+
+    def predict(self, batch):
+        """Run the model on a preprocessed batch and return a (N, K) array"""
+        return self.run(self.model, batch)
+
+    def analyze(self, image_paths, face_boxes=None):
+        import numpy as np
+
+        if face_boxes is None:
+            face_boxes = [None] * len(image_paths)
+
+        results = [None] * len(image_paths)
+        arrays = []
+        indexes = []
+        for index, (image_path, face_box) in enumerate(zip(image_paths, face_boxes)):
+            try:
+                arrays.append(self.preprocess(image_path, face_box))
+                indexes.append(index)
+            except Exception as e:
+                results[index] = e
+
+        if arrays:
+            try:
+                predictions = self.predict(np.stack(arrays))
+            except Exception as e:
+                for index in indexes:
+                    results[index] = e
+            else:
+                for index, row in zip(indexes, predictions):
+                    results[index] = predictions_to_result(row)
+        return add_recommendations(results)
+
+    def benchmark(self, batch, repeat=5):
+        """Return the best wall time in seconds of predict() on `batch`"""
+        self.predict(batch)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.predict(batch)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+
+class OnnxRuntimeBackend(ModelBackend):
+    name = 'onnx'
+
+    def load_model(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(self.model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def run(self, model, batch):
+        input_name = model.get_inputs()[0].name
+        return model.run(None, {input_name: batch})[0]
+
+    @staticmethod
+    def quantize(model_path, quantized_model_path):
+        """Write an int8 dynamically quantized copy of an ONNX model"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(model_path), str(quantized_model_path), weight_type=QuantType.QInt8)
+
+
+class TorchScriptBackend(ModelBackend):
+    name = 'torchscript'
+
+    def load_model(self):
+        import torch
+
+        torch.set_num_threads(self.intra_op_threads)
+        try:
+            torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError:
+            # Can only be set once per process, before any parallel work
+            pass
+        model = torch.jit.load(self.model_path, map_location='cpu')
+        model.eval()
+        return model
+
+    def run(self, model, batch):
+        import torch
+
+        with torch.inference_mode():
+            return model(torch.from_numpy(batch)).numpy()
+
+
+class RemoteBackend(ModelBackend):
+    """
+    Preprocesses locally and runs the model in the shared inference server
+
+    Start the server with `manage.py run_inference_server`.
+    """
+    name = 'remote'
+
+    def __init__(self, socket_path, timeout=30, **options):
+        super().__init__(**options)
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+
+    def warm_up(self):
+        pass
+
+    def predict(self, batch):
+        from .server import request_predictions
+
+        return request_predictions(self.socket_path, batch, timeout=self.timeout)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (MockBackend, MlModelBackend, OnnxRuntimeBackend, TorchScriptBackend, RemoteBackend)
+}
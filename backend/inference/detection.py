@@ -0,0 +1,119 @@
+"""
+Face detection run before analysis
+
+Uploads without a detectable face are rejected before they are stored or
+the model runs, and
+for the rest only the face region (plus a margin) is passed to the model.
+Boxes are (x, y, width, height) in pixels of the original image and are
+stored on FacialAnalysis.face_box so re-analysis can skip detection.
+
+The 'haar' detector uses OpenCV's frontal face Haar cascade on a
+downscaled grayscale copy, which takes a few milliseconds on a CPU.
+Images are rotated by their EXIF orientation first (phones often store
+portrait shots as landscape pixels plus a tag), so boxes are in the
+upright frame that preprocessing and thumbnails also use.
+"""
+import importlib.util
+import threading
+
+
+class NoFaceDetected(ValueError):
+    pass
+
+
+class FaceDetector:
+    name = None
+
+    def detect(self, image):
+        """Return the face box for an image path or file, or raise NoFaceDetected"""
+        raise NotImplementedError
+
+    def detect_many(self, images):
+        """Return a box or the exception raised, for each image in order"""
+        results = []
+        for image in images:
+            try:
+                results.append(self.detect(image))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class NullDetector(FaceDetector):
+    """Detection disabled - no box, the whole image is used"""
+    name = 'none'
+
+    def detect(self, image):
+        return None
+
+
+class HaarCascadeDetector(FaceDetector):
+    name = 'haar'
+    max_side = 640
+
+    def __init__(self, margin=0.2, min_size=40):
+        self.margin = margin
+        self.min_size = min_size
+        self._local = threading.local()
+
+    @property
+    def cascade(self):
+        # CascadeClassifier is not safe to share between threads
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            import cv2
+
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self._local.cascade = cascade
+        return cascade
+
+    def detect(self, image):
+        import numpy as np
+        from PIL import Image, ImageOps
+
+        if hasattr(image, 'seek'):
+            image.seek(0)
+        with Image.open(image) as img:
+            img = ImageOps.exif_transpose(img)
+            width, height = img.size
+            scale = min(1.0, self.max_side / max(width, height))
+            gray = img.convert('L')
+            if scale < 1.0:
+                gray = gray.resize((round(width * scale), round(height * scale)), Image.BILINEAR)
+            pixels = np.asarray(gray)
+
+        min_size = max(1, round(self.min_size * scale))
+        faces = self.cascade.detectMultiScale(
+            pixels, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size)
+        )
+        if hasattr(image, 'seek'):
+            image.seek(0)
+        if len(faces) == 0:
+            raise NoFaceDetected('No face detected in the image. Please retake the photo with your face centered.')
+
+        # Use the largest face, mapped back to the original image size
+        x, y, w, h = (value / scale for value in max(faces, key=lambda face: face[2] * face[3]))
+        dx, dy = w * self.margin, h * self.margin
+        left = max(0, round(x - dx))
+        top = max(0, round(y - dy))
+        right = min(width, round(x + w + dx))
+        bottom = min(height, round(y + h + dy))
+        return [left, top, right - left, bottom - top]
+
+
+def create_detector(name='auto', margin=0.2):
+    if name == 'auto':
+        name = 'haar' if importlib.util.find_spec('cv2') is not None else 'none'
+    if name == 'haar':
+        return HaarCascadeDetector(margin=margin)
+    if name == 'none':
+        return NullDetector()
+    raise ValueError(f'Unknown face detector: {name}')
+
+
+def crop_to_box(img, face_box):
+    """Crop a PIL image to an (x, y, width, height) box"""
+    if not face_box:
+        return img
+    x, y, w, h = face_box
+    return img.crop((x, y, x + w, y + h))
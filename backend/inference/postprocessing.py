@@ -0,0 +1,54 @@
+from ..fields import METRIC_CODES
+
+
+def classify_severity(score):
+    """Convert numeric score to severity level"""
+    if score < 0.3:
+        return 'low'
+    elif score < 0.7:
+        return 'medium'
+    else:
+        return 'high'
+
+
+def classify_hydration(score):
+    """Convert numeric score to hydration level"""
+    if score < 0.25:
+        return 'poor'
+    elif score < 0.5:
+        return 'fair'
+    elif score < 0.75:
+        return 'good'
+    else:
+        return 'excellent'
+
+
+def classify(metric, score):
+    if metric == 'hydration':
+        return classify_hydration(score)
+    return classify_severity(score)
+
+
+def predictions_to_result(row):
+    """
+    Convert one row of model output into the analysis result format
+
+    The row holds one score in [0, 1] per metric, in METRIC_CODES order.
+    Recommendations are added per batch by recommendations.add_recommendations.
+    """
+    scores = [float(value) for value in row[:len(METRIC_CODES)]]
+    skin_health = {
+        metric: classify(metric, score)
+        for metric, score in zip(METRIC_CODES, scores)
+    }
+    # Hydration is the only metric where higher is better
+    issue_scores = [
+        1 - score if metric == 'hydration' else score
+        for metric, score in zip(METRIC_CODES, scores)
+    ]
+    return {
+        'skin_health': skin_health,
+        'recommendations': [],
+        'overall_score': round(10 * (1 - sum(issue_scores) / len(issue_scores)), 2),
+        'confidence': round(max(abs(score - 0.5) for score in scores) * 2, 2)
+    }
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from .detection import crop_to_box
+
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def load_image_array(image_path, input_size=224, face_box=None):
+    """Load an image (cropped to face_box if given) as a normalized float32 CHW array"""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as img:
+        # Face boxes are in the EXIF-upright frame
+        img = crop_to_box(ImageOps.exif_transpose(img), face_box)
+        img = img.convert('RGB').resize((input_size, input_size), Image.BILINEAR)
+        array = np.asarray(img, dtype=np.float32) / 255.0
+
+    array = (array - np.array(IMAGENET_MEAN, dtype=np.float32)) / np.array(IMAGENET_STD, dtype=np.float32)
+    return np.ascontiguousarray(array.transpose(2, 0, 1))
+
+
+def save_face_crop(image_path, face_box, path):
+    """Write the upright face crop of an image to `path` as a JPEG"""
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as img:
+        img = crop_to_box(ImageOps.exif_transpose(img), face_box)
+        img.convert('RGB').save(path, format='JPEG', quality=95)
+    return path
+
+
+@contextmanager
+def face_crop_paths(image_paths, face_boxes=None):
+    """
+    Yield, per image, a temporary face crop file, the original path when
+    there is no box, or the exception raised while cropping
+
+    For backends that take file paths; the files are removed on exit.
+    """
+    image_paths = list(image_paths)
+    face_boxes = face_boxes or [None] * len(image_paths)
+    if not any(face_boxes):
+        yield image_paths
+        return
+
+    with tempfile.TemporaryDirectory(prefix='masklens-crop-') as directory:
+        paths = []
+        for index, (image_path, face_box) in enumerate(zip(image_paths, face_boxes)):
+            if not face_box or isinstance(image_path, Exception):
+                paths.append(image_path)
+                continue
+            try:
+                paths.append(save_face_crop(image_path, face_box, os.path.join(directory, f'{index}.jpg')))
+            except Exception as e:
+                paths.append(e)
+        yield paths
@@ -0,0 +1,126 @@
+"""
+Local inference server shared by all web workers
+
+The server owns a small pool of inference processes, each holding the
+model once, and listens on a Unix socket. Web workers using the 'remote'
+backend preprocess images themselves, copy the batch into a
+multiprocessing.shared_memory block and send only its name, shape and
+dtype as one JSON line; the reply is one JSON line with the raw model
+output rows (or an error).
+
+Model memory therefore scales with the inference pool size instead of
+the number of web workers, and the pool size caps inference concurrency
+independently of HTTP concurrency - requests beyond it wait in the pool
+queue.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+from multiprocessing import shared_memory
+
+
+_worker_backend = None
+
+
+def _attach(name):
+    """Attach to an existing block without letting this process unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers every attached block with the resource
+        # tracker, which would unlink it when this worker exits
+        from multiprocessing import resource_tracker
+
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+def _init_worker(backend_name):
+    from . import create_backend
+
+    global _worker_backend
+    _worker_backend = create_backend(BACKEND=backend_name)
+    _worker_backend.warm_up()
+
+
+def _predict(name, shape, dtype):
+    import numpy as np
+
+    block = _attach(name)
+    batch = None
+    try:
+        batch = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        predictions = _worker_backend.predict(batch)
+        return np.asarray(predictions, dtype=np.float64).tolist()
+    finally:
+        # The view must be gone before the block can be closed
+        del batch
+        block.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            predictions = self.server.pool.apply(
+                _predict, (request['shm'], tuple(request['shape']), request['dtype'])
+            )
+            response = {'predictions': predictions}
+        except Exception as e:
+            response = {'error': f'{type(e).__name__}: {e}'}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, backend_name, workers=1):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.pool = multiprocessing.get_context('fork').Pool(
+            processes=workers, initializer=_init_worker, initargs=(backend_name,)
+        )
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def request_predictions(socket_path, batch, timeout=30):
+    """Send a preprocessed batch to the inference server and return its output"""
+    import numpy as np
+
+    batch = np.ascontiguousarray(batch)
+    block = shared_memory.SharedMemory(create=True, size=batch.nbytes)
+    try:
+        np.ndarray(batch.shape, dtype=batch.dtype, buffer=block.buf)[...] = batch
+
+        header = {'shm': block.name, 'shape': list(batch.shape), 'dtype': batch.dtype.str}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(header).encode() + b'\n')
+            with sock.makefile('rb') as reader:
+                line = reader.readline()
+    finally:
+        block.close()
+        block.unlink()
+
+    if not line:
+        raise ConnectionError('Inference server closed the connection without a response')
+    response = json.loads(line)
+    if 'error' in response:
+        raise RuntimeError(f'Inference server error: {response["error"]}')
+    return np.asarray(response['predictions'], dtype=np.float32)
@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import User, FacialAnalysis, WeeklySummary
+from backend.renderers import FastJSONRenderer
+from backend.serializers import (
+    FacialAnalysisSerializer,
+    FacialAnalysisListSerializer,
+    WeeklySummarySerializer,
+    WeeklySummaryListSerializer
+)
+from backend.inference import mock_facial_analysis
+
+
+class Command(BaseCommand):
+    help = 'Compare the ModelSerializer + JSONRenderer list path with the values()-based fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        # Fixture rows are rolled back when the benchmark finishes
+        with transaction.atomic():
+            user = self._create_fixtures(rows)
+            request = RequestFactory().get('/api/analysis/list/', HTTP_HOST='localhost')
+            context = {'request': request}
+
+            analyses = FacialAnalysis.objects.filter(user=user)
+            summaries = WeeklySummary.objects.filter(user=user)
+
+            self._compare(
+                'FacialAnalysis',
+                lambda: JSONRenderer().render(FacialAnalysisSerializer(analyses, many=True, context=context).data),
+                lambda: FastJSONRenderer().render(FacialAnalysisListSerializer(analyses, context=context).data),
+                repeat,
+            )
+            self._compare(
+                'WeeklySummary',
+                lambda: JSONRenderer().render(WeeklySummarySerializer(summaries, many=True, context=context).data),
+                lambda: FastJSONRenderer().render(WeeklySummaryListSerializer(summaries, context=context).data),
+                repeat,
+            )
+            transaction.set_rollback(True)
+
+    def _create_fixtures(self, rows):
+        user = User.objects.create_user(
+            email=f'benchmark-{time.time_ns()}@example.com',
+            password=None,
+            full_name='Benchmark User'
+        )
+        result = mock_facial_analysis(None)
+        FacialAnalysis.objects.bulk_create(
+            FacialAnalysis(user=user, image=f'facial_images/benchmark_{i}.jpg', analysis_result=result)
+            for i in range(rows)
+        )
+        week_start = timezone.now().date()
+        WeeklySummary.objects.bulk_create(
+            WeeklySummary(
+                user=user,
+                week_start=week_start - timedelta(weeks=i),
+                week_end=week_start - timedelta(weeks=i) + timedelta(days=6),
+                total_analyses=5,
+                summary_data={'total_scans': 5, 'average_score': 7.2, 'trend': 'improving'}
+            )
+            for i in range(rows)
+        )
+        return user
+
+    def _time(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _compare(self, label, baseline, fast, repeat):
+        if baseline() != fast():
+            raise CommandError(f'{label}: fast path output differs from the serializer output')
+
+        baseline_time = self._time(baseline, repeat)
+        fast_time = self._time(fast, repeat)
+        self.stdout.write(
+            f'{label}: serializer {baseline_time * 1000:.1f} ms, '
+            f'fast path {fast_time * 1000:.1f} ms, '
+            f'speedup {baseline_time / fast_time:.1f}x'
+        )
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from backend.models import FacialAnalysis
+from backend.storage import delete_unreferenced_files
+
+
+class Command(BaseCommand):
+    help = 'Delete stored images that no analysis references, after a grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Only delete files last written at least this long ago')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        field = FacialAnalysis._meta.get_field('image')
+        deleted = delete_unreferenced_files(
+            field,
+            field.upload_to.rstrip('/'),
+            timedelta(hours=options['grace_hours']),
+            dry_run=options['dry_run']
+        )
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(deleted)} unreferenced files'))
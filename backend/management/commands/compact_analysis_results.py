@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import FacialAnalysis
+
+
+class Command(BaseCommand):
+    help = 'Rewrite stored analysis results using the compact encoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = FacialAnalysis.objects.exclude(analysis_result__isnull=True).only('id', 'analysis_result')
+
+        batch = []
+        total = 0
+        for analysis in queryset.iterator(chunk_size=batch_size):
+            batch.append(analysis)
+            if len(batch) >= batch_size:
+                total += FacialAnalysis.objects.bulk_update(batch, ['analysis_result'])
+                batch = []
+        if batch:
+            total += FacialAnalysis.objects.bulk_update(batch, ['analysis_result'])
+
+        self.stdout.write(self.style.SUCCESS(f'Compacted {total} analysis results'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import User
+from backend.trends import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the day/week/month trend rollups from stored analyses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only rebuild rollups for this user')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(analyses__isnull=False).distinct()
+        if options['email']:
+            users = users.filter(email=options['email'])
+
+        count = 0
+        for user in users.iterator():
+            rebuild_rollups(user)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trend rollups for {count} users'))
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.models import FacialAnalysis, User, WeeklySummary
+from backend.summaries import update_weekly_summary, week_start_for
+
+
+class Command(BaseCommand):
+    help = 'Recompute weekly summaries from stored analyses (e.g. periodically, to repair missed updates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only rebuild summaries for this user')
+        parser.add_argument('--weeks', type=int, default=4,
+                            help='Rebuild this many most recent weeks (0 for all, default 4)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(Q(analyses__isnull=False) | Q(weekly_summaries__isnull=False)).distinct()
+        if options['email']:
+            users = users.filter(email=options['email'])
+
+        since = None
+        if options['weeks'] > 0:
+            since = week_start_for(timezone.localdate()) - timedelta(weeks=options['weeks'] - 1)
+
+        count = 0
+        for user in users.iterator():
+            analyses = FacialAnalysis.objects.filter(user=user)
+            summaries = WeeklySummary.objects.filter(user=user)
+            if since is not None:
+                analyses = analyses.filter(created_at__date__gte=since)
+                summaries = summaries.filter(week_start__gte=since)
+            # Weeks with analyses, plus summarized weeks whose analyses are gone
+            weeks = set(analyses.dates('created_at', 'week'))
+            weeks.update(summaries.values_list('week_start', flat=True))
+            for week_start in sorted(weeks):
+                update_weekly_summary(user, week_start)
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} weekly summaries'))
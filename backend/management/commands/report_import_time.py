@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+TARGETS = {
+    # What a worker imports before it can serve its first request
+    'urls': (
+        'import django; django.setup(); '
+        'from django.urls import get_resolver; get_resolver().url_patterns'
+    ),
+    # The WSGI entry point, including the preload hook when enabled
+    'wsgi': 'import masklens_backend.wsgi',
+}
+
+HEAVY_MODULES = ('PIL.Image', 'numpy', 'cv2', 'onnxruntime', 'torch', 'tensorflow', 'backend.ml_model')
+
+
+class Command(BaseCommand):
+    help = 'Measure worker startup imports with python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='urls')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--depth', type=int, default=1,
+                            help='Include nested imports up to this depth in the top list')
+        parser.add_argument('--preload', choices=['none', 'imports', 'model'],
+                            help='Override MASKLENS_PRELOAD for the measured process')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'masklens_backend.settings')
+        if options['preload']:
+            env['MASKLENS_PRELOAD'] = options['preload']
+
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', TARGETS[options['target']]],
+            env=env, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+
+        entries = []
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            label, cumulative_us, name = line.split('|')
+            self_us = int(label.split(':')[1])
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            entries.append((name.strip(), self_us, int(cumulative_us), depth))
+
+        total = sum(cumulative for _, _, cumulative, depth in entries if depth == 0)
+        self.stdout.write(f'Target: {options["target"]}  modules: {len(entries)}  total: {total / 1000:.1f} ms')
+
+        self.stdout.write(f'\nTop {options["top"]} imports by cumulative time (depth <= {options["depth"]}):')
+        shallow = sorted((entry for entry in entries if entry[3] <= options['depth']), key=lambda entry: -entry[2])
+        for name, _, cumulative, depth in shallow[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {"  " * depth}{name}')
+
+        heavy = [
+            (name, cumulative) for name, _, cumulative, _ in entries
+            if name in HEAVY_MODULES
+        ]
+        self.stdout.write('\nHeavy imaging/ML modules loaded at startup:')
+        if heavy:
+            for name, cumulative in heavy:
+                self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+        else:
+            self.stdout.write('  none')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.inference import get_inference_options
+from backend.inference.backends import BACKENDS
+from backend.inference.server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Run the shared inference server used by the "remote" inference backend'
+
+    def add_arguments(self, parser):
+        options = get_inference_options()
+        parser.add_argument('--socket', default=str(options.get('SOCKET_PATH')))
+        parser.add_argument('--backend', default=options.get('SERVER_BACKEND'))
+        parser.add_argument('--workers', type=int, default=options.get('SERVER_WORKERS', 1),
+                            help='Inference processes, i.e. the maximum number of concurrent batches')
+
+    def handle(self, *args, **options):
+        backend = options['backend']
+        if backend not in BACKENDS or backend == 'remote':
+            raise CommandError(f'Invalid server backend: {backend}')
+
+        server = InferenceServer(options['socket'], backend, workers=options['workers'])
+        self.stdout.write(
+            f'Inference server ({backend}, {options["workers"]} workers) listening on {options["socket"]}'
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,100 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.fields import METRIC_CODES
+from backend.inference import create_backend, get_inference_options
+from backend.inference.backends import ModelBackend
+from backend.inference.postprocessing import predictions_to_result
+
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+
+class Command(BaseCommand):
+    help = 'Compare the int8 quantized model against the full-precision model on sample images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('samples', help='Directory of sample images')
+        parser.add_argument('--limit', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=8)
+        parser.add_argument('--quantize', action='store_true',
+                            help='Write QUANTIZED_MODEL_PATH from MODEL_PATH before validating')
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        full = create_backend(USE_QUANTIZED=False)
+        if not isinstance(full, ModelBackend):
+            raise CommandError(
+                f'MASKLENS_INFERENCE BACKEND must be a model backend (onnx, torchscript), not {full.name!r}'
+            )
+
+        settings = get_inference_options()
+        if options['quantize']:
+            if not hasattr(type(full), 'quantize'):
+                raise CommandError(
+                    f'--quantize is not supported for the {full.name} backend; quantize the model '
+                    'yourself and set QUANTIZED_MODEL_PATH to the result'
+                )
+            type(full).quantize(settings['MODEL_PATH'], settings['QUANTIZED_MODEL_PATH'])
+            self.stdout.write(f'Wrote {settings["QUANTIZED_MODEL_PATH"]}')
+        quantized = create_backend(USE_QUANTIZED=True)
+
+        paths = sorted(
+            path for path in Path(options['samples']).rglob('*')
+            if path.suffix.lower() in IMAGE_SUFFIXES
+        )[:options['limit']]
+        if not paths:
+            raise CommandError(f'No sample images found in {options["samples"]}')
+
+        batch_size = options['batch_size']
+        batches = [
+            np.stack([full.preprocess(path) for path in paths[i:i + batch_size]])
+            for i in range(0, len(paths), batch_size)
+        ]
+
+        # Warm up both sessions so loading is not part of the timings
+        full.predict(batches[0])
+        quantized.predict(batches[0])
+
+        full_time = quantized_time = 0.0
+        full_rows = []
+        quantized_rows = []
+        for batch in batches:
+            start = time.perf_counter()
+            full_rows.append(full.predict(batch))
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            quantized_rows.append(quantized.predict(batch))
+            quantized_time += time.perf_counter() - start
+
+        full_out = np.concatenate(full_rows).astype(np.float64)
+        quantized_out = np.concatenate(quantized_rows).astype(np.float64)
+        diff = np.abs(full_out - quantized_out)
+
+        full_results = [predictions_to_result(row) for row in full_out]
+        quantized_results = [predictions_to_result(row) for row in quantized_out]
+
+        self.stdout.write(f'Images: {len(paths)} in {len(batches)} batches of up to {batch_size}')
+        self.stdout.write(f'Raw output drift: mean {diff.mean():.5f}, max {diff.max():.5f}')
+        for metric in METRIC_CODES:
+            agree = sum(
+                a['skin_health'][metric] == b['skin_health'][metric]
+                for a, b in zip(full_results, quantized_results)
+            )
+            self.stdout.write(f'  {metric}: level agreement {100 * agree / len(paths):.1f}%')
+        score_drift = [
+            abs(a['overall_score'] - b['overall_score'])
+            for a, b in zip(full_results, quantized_results)
+        ]
+        self.stdout.write(
+            f'Overall score drift: mean {sum(score_drift) / len(score_drift):.3f}, max {max(score_drift):.3f}'
+        )
+        self.stdout.write(
+            f'Latency per image: full {1000 * full_time / len(paths):.2f} ms, '
+            f'quantized {1000 * quantized_time / len(paths):.2f} ms, '
+            f'speedup {full_time / quantized_time:.2f}x'
+        )
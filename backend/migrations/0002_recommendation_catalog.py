@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:11
+
+import backend.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='facialanalysis',
+            name='analysis_result',
+            field=backend.fields.CompactAnalysisResultField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0002_recommendation_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('bucket_start', models.DateField()),
+                ('total_analyses', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_count', models.IntegerField(default=0)),
+                ('metric_sums', models.JSONField(default=dict)),
+                ('metric_counts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'unique_together': {('user', 'period', 'bucket_start')},
+            },
+        ),
+    ]
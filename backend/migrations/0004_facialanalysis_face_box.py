@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0003_analysis_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facialanalysis',
+            name='face_box',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_facialanalysis_face_box'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facialanalysis',
+            name='is_archived',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='facialanalysis',
+            index=models.Index(fields=['user', '-created_at'], name='backend_fac_user_id_0879c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facialanalysis',
+            index=models.Index(fields=['created_at'], name='backend_fac_created_42db43_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# Indexes matching email__istartswith, used by the admin email search:
+# SQLite compiles it to a case-insensitive LIKE, which can use an index
+# with NOCASE collation; PostgreSQL to UPPER(email::text) LIKE UPPER(...),
+# which needs an index on that expression with a pattern opclass.
+INDEX_SQL = {
+    'sqlite': 'CREATE INDEX IF NOT EXISTS backend_user_email_prefix_idx ON backend_user (email COLLATE NOCASE)',
+    'postgresql': (
+        'CREATE INDEX IF NOT EXISTS backend_user_email_prefix_idx '
+        'ON backend_user (UPPER(email::text) text_pattern_ops)'
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    sql = INDEX_SQL.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEX_SQL:
+        schema_editor.execute('DROP INDEX IF EXISTS backend_user_email_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_facialanalysis_archive_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
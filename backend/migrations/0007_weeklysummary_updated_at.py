@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_created_at(apps, schema_editor):
+    # Existing summaries may have been recomputed since, but treating them
+    # as old only means they are recomputed once more on first read
+    WeeklySummary = apps.get_model('backend', 'WeeklySummary')
+    WeeklySummary.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_user_email_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklysummary',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -97,14 +97,15 @@ def analyze_with_tensorflow(image_path):
     predictions = model.predict(img_array)
     
     # Process results
+    skin_health = {
+        'acne': classify_severity(predictions[0][0]),
+        'dark_circles': classify_severity(predictions[0][1]),
+        'wrinkles': classify_severity(predictions[0][2]),
+        'hydration': classify_hydration(predictions[0][3])
+    }
     return {
-        'skin_health': {
-            'acne': classify_severity(predictions[0][0]),
-            'dark_circles': classify_severity(predictions[0][1]),
-            'wrinkles': classify_severity(predictions[0][2]),
-            'hydration': classify_hydration(predictions[0][3])
-        },
-        'recommendations': generate_recommendations(predictions),
+        'skin_health': skin_health,
+        'recommendations': generate_recommendations(skin_health),
         'overall_score': float(np.mean(predictions[0]) * 10)
     }
 
@@ -160,11 +161,9 @@ def classify_hydration(score):
         return 'excellent'
 
 
-def generate_recommendations(predictions):
-    """Generate personalized recommendations based on predictions"""
-    recommendations = []
-    
-    # Add recommendations based on detected issues
-    # This is just an example - customize based on your needs
+def generate_recommendations(skin_health):
+    """Generate personalized recommendations based on the skin health levels"""
+    # Uses the rules in backend/recommendations.py - customize RULES there
+    from backend.recommendations import recommend
     
-    return recommendations
+    return recommend(skin_health)
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
+from .fields import CompactAnalysisResultField
 
 
 class UserManager(BaseUserManager):
@@ -35,15 +36,30 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class Recommendation(models.Model):
+    text = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.text
+
+
 class FacialAnalysis(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analyses')
     image = models.ImageField(upload_to='facial_images/')
-    analysis_result = models.JSONField(null=True, blank=True)
+    analysis_result = CompactAnalysisResultField(null=True, blank=True)
+    # [x, y, width, height] of the detected face in the original image
+    face_box = models.JSONField(null=True, blank=True)
+    # Archived analyses are kept but hidden from the user's history
+    is_archived = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Facial Analyses'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -56,6 +72,7 @@ class WeeklySummary(models.Model):
     total_analyses = models.IntegerField(default=0)
     summary_data = models.JSONField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-week_start']
@@ -63,3 +80,29 @@ class WeeklySummary(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - Week {self.week_start}"
+
+
+class AnalysisRollup(models.Model):
+    """Per-user aggregates of analyses for one day, week or month bucket"""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    bucket_start = models.DateField()
+    total_analyses = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_count = models.IntegerField(default=0)
+    metric_sums = models.JSONField(default=dict)
+    metric_counts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['bucket_start']
+        unique_together = ['user', 'period', 'bucket_start']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.period} {self.bucket_start}"
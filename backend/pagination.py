@@ -0,0 +1,55 @@
+"""
+Paginator for the admin changelists of large tables
+
+COUNT(*) on a table with millions of rows scans the whole table on every
+page load. For unfiltered lists above `threshold` rows the paginator uses
+the database's own row estimate instead (PostgreSQL pg_class, MySQL
+information_schema, SQLite sqlite_stat1 after ANALYZE). Filtered lists and
+databases without statistics get an exact count.
+"""
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """Row count of the model's table from planner statistics, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+        'mysql': (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s'
+        ),
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # e.g. sqlite_stat1 does not exist before the first ANALYZE
+        return None
+    if row is None or row[0] is None:
+        return None
+    # sqlite_stat1.stat is "<rows> <rows per index value>..."
+    estimate = int(float(str(row[0]).split()[0]))
+    # PostgreSQL reports -1 for tables that were never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
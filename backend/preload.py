@@ -0,0 +1,73 @@
+"""
+Preload hook for preload-then-fork WSGI servers
+
+With MASKLENS_PRELOAD set, masklens_backend/wsgi.py calls preload() right
+after building the application. Under a server that imports the WSGI
+module in the master before forking workers (e.g. `gunicorn --preload`),
+everything loaded here is shared copy-on-write by all workers instead of
+being loaded again in each one:
+
+- 'imports': URLconf, views, Pillow and the libraries used by the
+  configured backend (numpy, onnxruntime, torch) and face detector (numpy
+  and opencv for 'haar', which 'auto' picks when opencv is installed)
+- 'model': the above, plus the inference model and face detector
+
+Loading the model before forking is only safe for runtimes that do not
+start threads while loading: use it with INTRA_OP_THREADS = INTER_OP_THREADS
+= 1, or run the model in the inference server ('remote' backend) instead.
+"""
+import gc
+import importlib.util
+import logging
+import time
+
+from django.urls import get_resolver
+
+from .inference import get_backend, get_detector, get_inference_options
+
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MODULES = {
+    'onnx': ['numpy', 'onnxruntime'],
+    'torchscript': ['numpy', 'torch'],
+    'remote': ['numpy'],
+}
+
+DETECTOR_MODULES = {
+    'haar': ['numpy', 'cv2', 'PIL.ImageOps'],
+}
+
+
+def _import_if_installed(name):
+    if importlib.util.find_spec(name) is not None:
+        # __import__ (unlike importlib.import_module) goes through the same
+        # path as an import statement, so it shows up in -X importtime
+        __import__(name)
+
+
+def preload(mode='imports'):
+    start = time.perf_counter()
+
+    # Importing the URLconf pulls in the views, serializers and DRF
+    get_resolver().url_patterns
+
+    _import_if_installed('PIL.Image')
+    options = get_inference_options()
+    for name in BACKEND_MODULES.get(options.get('BACKEND'), []):
+        _import_if_installed(name)
+    # Creating the detector only resolves 'auto'; it loads nothing yet
+    for name in DETECTOR_MODULES.get(get_detector().name, []):
+        _import_if_installed(name)
+
+    if mode == 'model':
+        get_backend().warm_up()
+        detector = get_detector()
+        if hasattr(detector, 'cascade'):
+            detector.cascade
+
+    # Keep the preloaded objects out of the workers' garbage collection so
+    # refcount updates by the collector don't copy their pages
+    gc.freeze()
+
+    logger.info('Preloaded (%s) in %.0f ms', mode, (time.perf_counter() - start) * 1000)
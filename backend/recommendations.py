@@ -0,0 +1,107 @@
+"""
+Recommendations for analysis results
+
+RULES map a skin metric at one or more levels to a recommendation with a
+priority; rules without a metric apply to everyone. The engine compiles
+them once into an index keyed by (metric, level), so the recommendations
+for a result are the merged index entries of its six metric levels,
+highest priority first, capped at `limit`.
+
+A result's levels form its profile, e.g. ('low', 'medium', 'low', 'good',
+'low', 'medium') in METRIC_CODES order. There are only about a thousand
+possible profiles and a few common ones, so the recommendations per
+profile are memoized and recommend_many() looks up each distinct profile
+in a batch once.
+
+Texts are stored through the Recommendation catalog (see fields.py), so
+editing a rule's text adds a new catalog entry and existing results keep
+the text they were given.
+"""
+from functools import lru_cache
+
+from .fields import METRIC_CODES
+
+
+# (metric or None for everyone, levels, priority, text)
+RULES = [
+    ('acne', ('high',), 95, 'See a dermatologist about persistent acne'),
+    ('acne', ('medium', 'high'), 85, 'Use a salicylic acid or benzoyl peroxide spot treatment'),
+    ('acne', ('medium', 'high'), 60, 'Avoid touching your face and change pillowcases often'),
+    ('dark_circles', ('medium', 'high'), 75, 'Get 7-8 hours of sleep'),
+    ('dark_circles', ('medium', 'high'), 65, 'Use an eye cream for dark circles'),
+    ('dark_circles', ('high',), 55, 'Use a cold compress on tired eyes in the morning'),
+    ('wrinkles', ('medium', 'high'), 80, 'Use a retinoid serum at night'),
+    ('wrinkles', ('high',), 50, 'Consider a peptide moisturizer'),
+    ('hydration', ('poor', 'fair'), 90, 'Use a hyaluronic acid serum on damp skin'),
+    ('hydration', ('poor',), 70, 'Switch to a richer, fragrance-free moisturizer'),
+    ('hydration', ('poor', 'fair', 'good'), 35, 'Stay hydrated'),
+    ('redness', ('medium', 'high'), 78, 'Use soothing products with niacinamide or centella'),
+    ('redness', ('high',), 88, 'Avoid harsh exfoliants and hot water on your face'),
+    ('pores', ('medium', 'high'), 58, 'Use a BHA exfoliant two to three times a week'),
+    ('pores', ('high',), 45, 'Use a clay mask once a week'),
+    (None, (), 40, 'Use a gentle cleanser twice daily'),
+    (None, (), 38, 'Apply moisturizer with SPF 30+'),
+]
+
+
+class RecommendationEngine:
+
+    def __init__(self, rules, limit=5, cache_size=2048):
+        self.limit = limit
+        self._general = []
+        self._index = {}
+        # Ties keep the rule order
+        for order, (metric, levels, priority, text) in enumerate(rules):
+            entry = (-priority, order, text)
+            if metric is None:
+                self._general.append(entry)
+            else:
+                for level in levels:
+                    self._index.setdefault((metric, level), []).append(entry)
+        self._for_profile = lru_cache(maxsize=cache_size)(self._compute)
+
+    @staticmethod
+    def profile(skin_health):
+        return tuple(skin_health.get(metric) for metric in METRIC_CODES)
+
+    def _compute(self, profile):
+        entries = list(self._general)
+        for metric, level in zip(METRIC_CODES, profile):
+            entries.extend(self._index.get((metric, level), ()))
+        entries.sort()
+
+        texts = []
+        for _, _, text in entries:
+            if text not in texts:
+                texts.append(text)
+                if len(texts) == self.limit:
+                    break
+        return tuple(texts)
+
+    def recommend(self, skin_health):
+        return list(self._for_profile(self.profile(skin_health)))
+
+    def recommend_many(self, skin_healths):
+        """Recommendations for each skin_health dict, computed once per distinct profile"""
+        profiles = [self.profile(skin_health) for skin_health in skin_healths]
+        by_profile = {profile: self._for_profile(profile) for profile in set(profiles)}
+        return [list(by_profile[profile]) for profile in profiles]
+
+    def cache_info(self):
+        return self._for_profile.cache_info()
+
+
+engine = RecommendationEngine(RULES)
+
+
+def recommend(skin_health):
+    return engine.recommend(skin_health)
+
+
+def add_recommendations(results):
+    """Fill in `recommendations` for every result dict in a batch (exceptions are skipped)"""
+    analyzed = [result for result in results if isinstance(result, dict)]
+    recommendations = engine.recommend_many(result.get('skin_health', {}) for result in analyzed)
+    for result, texts in zip(analyzed, recommendations):
+        result['recommendations'] = texts
+    return results
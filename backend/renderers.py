@@ -0,0 +1,43 @@
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that uses orjson when it is installed
+
+    Falls back to the stdlib-based DRF renderer when orjson is missing or
+    when the client asks for indented output (e.g. the browsable API).
+    """
+
+    def __init__(self):
+        self._encoder = encoders.JSONEncoder()
+
+    def _default(self, obj):
+        # Let DRF's encoder deal with lazy strings, Decimals, UUIDs, etc.
+        # so the output matches the stdlib renderer
+        return self._encoder.default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=self._default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+
+        # Same as JSONRenderer: keep the output a strict javascript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,59 @@
+"""
+Per-user cache of list responses
+
+Entries are keyed by a per-user version that the derived data updaters
+(see events.py) bump whenever the user's analyses or summaries change, so
+a stale entry is never read again and simply expires.
+
+Disabled unless MASKLENS_LIST_CACHE['TIMEOUT'] is set. The default
+LocMemCache is per process: with several workers, use a cache shared by
+all of them (MASKLENS_LIST_CACHE['CACHE_ALIAS']) so every worker sees the
+version bumps.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _options():
+    return getattr(settings, 'MASKLENS_LIST_CACHE', {})
+
+
+def _cache():
+    return caches[_options().get('CACHE_ALIAS', 'default')]
+
+
+def _version_key(name, user_id):
+    return f'list-version:{name}:{user_id}'
+
+
+def cached_list(request, name, build):
+    """Return the cached data for the user's `name` list, calling build() on a miss"""
+    timeout = _options().get('TIMEOUT', 0)
+    if not timeout:
+        return build()
+
+    cache = _cache()
+    user_id = request.user.pk
+    # Versions never expire; a new one starts from the clock so it cannot
+    # collide with entries written before it was evicted
+    version = cache.get_or_set(_version_key(name, user_id), time.time_ns, None)
+    # URLs in the data are absolute, so the host is part of the key
+    key = f'list:{name}:{user_id}:{version}:{request.scheme}://{request.get_host()}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout)
+    return data
+
+
+def invalidate(user_id, *names):
+    if not _options().get('TIMEOUT', 0):
+        return
+    cache = _cache()
+    for name in names:
+        try:
+            cache.incr(_version_key(name, user_id))
+        except ValueError:
+            cache.set(_version_key(name, user_id), time.time_ns(), None)
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 from .models import User, FacialAnalysis, WeeklySummary
+from .trends import PERIODS, SERIES_METRICS
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -65,3 +69,115 @@ class WeeklySummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_email', 'week_start', 'week_end', 
                   'total_analyses', 'summary_data', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
+
+
+class TrendQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=PERIODS, default='week')
+    metrics = serializers.CharField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=366, default=52)
+    window = serializers.IntegerField(min_value=1, max_value=52, default=4)
+
+    def validate_metrics(self, value):
+        metrics = [metric.strip() for metric in value.split(',') if metric.strip()]
+        unknown = [metric for metric in metrics if metric not in SERIES_METRICS]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown metrics: {", ".join(unknown)}')
+        return metrics
+
+    def validate(self, data):
+        data.setdefault('metrics', list(SERIES_METRICS))
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError('start must be before end')
+        return data
+
+
+class ValuesListSerializer:
+    """
+    Read-only list serializer that builds dicts straight from values() rows
+
+    Produces the same output as the matching ModelSerializer with
+    many=True, without instantiating model or field objects per row.
+    """
+    values_fields = ()
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+        self.timezone = timezone.get_current_timezone()
+
+    def datetime_representation(self, value):
+        if value is None:
+            return None
+        value = value.astimezone(self.timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    @property
+    def data(self):
+        rows = self.queryset.values(*self.values_fields)
+        return [self.to_representation(row) for row in rows]
+
+    def iter_data(self, chunk_size=2000):
+        """Yield one representation at a time without caching the queryset"""
+        rows = self.queryset.values(*self.values_fields).iterator(chunk_size=chunk_size)
+        for row in rows:
+            yield self.to_representation(row)
+
+
+class FacialAnalysisListSerializer(ValuesListSerializer):
+    values_fields = ('id', 'user_id', 'user__email', 'image', 'analysis_result', 'created_at')
+
+    def __init__(self, queryset, context=None):
+        super().__init__(queryset, context)
+        self.storage = FacialAnalysis._meta.get_field('image').storage
+        self.request = self.context.get('request')
+        self.url_prefix = None
+        base_url = getattr(self.storage, 'base_url', None)
+        if isinstance(self.storage, FileSystemStorage) and base_url and base_url.startswith('/'):
+            # Same result as storage.url() + build_absolute_uri(), computed once
+            self.url_prefix = base_url
+            if self.request is not None:
+                self.url_prefix = self.request.build_absolute_uri(base_url)
+
+    def image_url(self, name):
+        if not name:
+            return None
+        if self.url_prefix is not None:
+            return self.url_prefix + filepath_to_uri(name).lstrip('/')
+        url = self.storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': row['user_id'],
+            'user_email': row['user__email'],
+            'image': self.image_url(row['image']),
+            'analysis_result': row['analysis_result'],
+            'created_at': self.datetime_representation(row['created_at']),
+        }
+
+
+class WeeklySummaryListSerializer(ValuesListSerializer):
+    values_fields = ('id', 'user_id', 'user__email', 'week_start', 'week_end',
+                     'total_analyses', 'summary_data', 'created_at')
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': row['user_id'],
+            'user_email': row['user__email'],
+            'week_start': row['week_start'].isoformat(),
+            'week_end': row['week_end'].isoformat(),
+            'total_analyses': row['total_analyses'],
+            'summary_data': row['summary_data'],
+            'created_at': self.datetime_representation(row['created_at']),
+        }
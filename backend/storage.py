@@ -0,0 +1,444 @@
+"""
+Media storage
+
+Uploaded files are stored under the SHA-256 of their content, fanned out
+over two levels of hash-prefix directories below the upload_to prefix:
+
+    facial_images/3f/a2/3fa2...c9.jpg
+
+With 65536 leaf directories no directory grows past a few hundred files
+even at millions of images, and identical uploads share one file. A file
+is therefore never deleted together with a row: another upload may have
+just stored the same content without committing its row yet. Instead,
+saving existing content refreshes the file's modification time, and
+delete_unreferenced_files() (the cleanup_media_files command) removes
+files no row references once they are older than a grace period. Both
+are checked again right before a file is deleted; the local storage
+first moves the file aside, so an upload racing with the cleanup writes
+a new copy instead of refreshing the one being deleted.
+Names already stored in the database (e.g. the flat layout) keep working.
+
+- ContentAddressedStorage: the local filesystem under MEDIA_ROOT. Files
+  are hashed while being written to MEDIA_ROOT/.tmp and moved into place
+  with os.replace, so a file is either absent or complete.
+- S3Storage: an S3-compatible bucket through boto3 (optional dependency),
+  e.g. AWS S3 or a local MinIO via ENDPOINT_URL. Object PUTs are atomic.
+
+Inference needs local files: local_image_paths() and iter_local_batches()
+return filesystem paths directly and download remote images in background
+threads to a temporary directory otherwise.
+"""
+import hashlib
+import itertools
+import mimetypes
+import os
+import posixpath
+import secrets
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
+
+
+def content_name(name, digest, levels=2):
+    """Content-addressed name for `name` (upload_to prefix and extension are kept)"""
+    directory = posixpath.dirname(name.replace('\\', '/'))
+    extension = os.path.splitext(name)[1].lower()
+    shards = [digest[i * 2:i * 2 + 2] for i in range(levels)]
+    return posixpath.join(directory, *shards, digest + extension)
+
+
+def hash_content(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedMixin:
+    fan_out_levels = 2
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save
+        return name
+
+
+@deconstructible
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    temp_dir_name = '.tmp'
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def _save(self, name, content):
+        temp_dir = os.path.join(self.location, self.temp_dir_name)
+        self._makedirs(temp_dir)
+        temp_path = os.path.join(temp_dir, secrets.token_hex(16))
+
+        digest = hashlib.sha256()
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+
+            name = content_name(name, digest.hexdigest(), self.fan_out_levels)
+            full_path = self.path(name)
+            try:
+                # Same content is already stored; mark it as recently used
+                # so the cleanup grace period starts again
+                os.utime(full_path)
+            except FileNotFoundError:
+                # Not stored, or just removed by the cleanup
+                self._makedirs(os.path.dirname(full_path))
+                os.replace(temp_path, full_path)
+            else:
+                os.remove(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def delete_if_unused(self, name, is_unused):
+        path = self.path(name)
+        quarantine_path = f'{path}.{secrets.token_hex(8)}.deleting'
+        try:
+            os.rename(path, quarantine_path)
+        except FileNotFoundError:
+            return False
+        # From here on, saving the same content stores a new file at `path`
+        try:
+            unused = is_unused(self._datetime_from_timestamp(os.stat(quarantine_path).st_mtime))
+        except BaseException:
+            os.replace(quarantine_path, path)
+            raise
+        if unused:
+            os.remove(quarantine_path)
+        else:
+            # Any file saved at `path` meanwhile has the same content
+            os.replace(quarantine_path, path)
+        return unused
+
+
+@deconstructible
+class S3Storage(ContentAddressedMixin, Storage):
+    """
+    Content-addressed objects in an S3-compatible bucket
+
+    URLs are BASE_URL + name when BASE_URL is set (public bucket or CDN),
+    presigned GET URLs valid for QUERYSTRING_EXPIRE seconds otherwise.
+    """
+
+    def __init__(self, bucket_name=None, endpoint_url=None, region_name=None,
+                 access_key=None, secret_key=None, location='', base_url=None,
+                 querystring_expire=3600, max_pool_connections=10):
+        if not bucket_name:
+            raise ImproperlyConfigured('S3Storage requires a bucket_name')
+        self.bucket_name = bucket_name
+        self.endpoint_url = endpoint_url or None
+        self.region_name = region_name or None
+        self.access_key = access_key or None
+        self.secret_key = secret_key or None
+        self.location = location.strip('/')
+        self.base_url = base_url
+        self.querystring_expire = querystring_expire
+        self.max_pool_connections = max_pool_connections
+
+    @cached_property
+    def client(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as e:
+            raise ImproperlyConfigured('S3Storage requires boto3 (pip install boto3)') from e
+
+        # Clients are thread-safe, so one is shared by the prefetch threads
+        return boto3.session.Session().client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=self.region_name,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            config=Config(max_pool_connections=self.max_pool_connections)
+        )
+
+    def _key(self, name):
+        name = name.replace('\\', '/')
+        return posixpath.join(self.location, name) if self.location else name
+
+    def _head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def _save(self, name, content):
+        name = content_name(name, hash_content(content), self.fan_out_levels)
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self._head(name) is None:
+            content.seek(0)
+            self.client.upload_fileobj(
+                content, self.bucket_name, self._key(name), ExtraArgs={'ContentType': content_type}
+            )
+        elif not self._refresh(name, content_type):
+            # Removed by the cleanup since the HEAD request
+            content.seek(0)
+            self.client.upload_fileobj(
+                content, self.bucket_name, self._key(name), ExtraArgs={'ContentType': content_type}
+            )
+        return name
+
+    def _refresh(self, name, content_type):
+        """Refresh LastModified of an existing object with an in-place copy; False if it is gone"""
+        from botocore.exceptions import ClientError
+
+        key = self._key(name)
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket_name, Key=key,
+                CopySource={'Bucket': self.bucket_name, 'Key': key},
+                ContentType=content_type, MetadataDirective='REPLACE'
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/') + '/' if path else (self.location + '/' if self.location else '')
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/'):
+            directories.extend(
+                entry['Prefix'][len(prefix):].rstrip('/') for entry in page.get('CommonPrefixes', [])
+            )
+            files.extend(entry['Key'][len(prefix):] for entry in page.get('Contents', []))
+        return directories, files
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError('S3Storage files are read-only')
+        f = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket_name, self._key(name), f)
+        f.seek(0)
+        return File(f, name=name)
+
+    def download(self, name, path):
+        self.client.download_file(self.bucket_name, self._key(name), path)
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self._key(name))
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['ContentLength']
+
+    def get_modified_time(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['LastModified']
+
+    def url(self, name):
+        if self.base_url:
+            return self.base_url.rstrip('/') + '/' + filepath_to_uri(self._key(name))
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': self._key(name)},
+            ExpiresIn=self.querystring_expire
+        )
+
+
+def iter_files(storage, directory):
+    """Yield the names of all files below `directory`"""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from iter_files(storage, posixpath.join(directory, subdirectory))
+
+
+def delete_if_unused(storage, name, is_unused):
+    """Delete `name` if is_unused(modified_time) is true; return whether it was deleted"""
+    if hasattr(storage, 'delete_if_unused'):
+        return storage.delete_if_unused(name, is_unused)
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    if not is_unused(modified):
+        return False
+    storage.delete(name)
+    return True
+
+
+def delete_unreferenced_files(field, directory, grace, dry_run=False, chunk_size=500):
+    """
+    Delete files below `directory` that no row of field.model references
+    and that were last written more than `grace` (a timedelta) ago
+
+    Returns the names of the deleted (or, with dry_run, deletable) files.
+    """
+    from django.utils import timezone
+
+    storage = field.storage
+    manager = field.model._default_manager
+    cutoff = timezone.now() - grace
+    deleted = []
+
+    def process(names):
+        referenced = set(
+            manager.filter(**{f'{field.name}__in': names}).values_list(field.name, flat=True)
+        )
+        for name in names:
+            if name in referenced:
+                continue
+            try:
+                if storage.get_modified_time(name) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if dry_run or delete_if_unused(storage, name, partial(is_unused, name)):
+                deleted.append(name)
+
+    def is_unused(name, modified):
+        # An upload of the same content may have happened since the
+        # chunk was checked
+        return modified <= cutoff and not manager.filter(**{field.name: name}).exists()
+
+    chunk = []
+    for name in iter_files(storage, directory):
+        chunk.append(name)
+        if len(chunk) == chunk_size:
+            process(chunk)
+            chunk = []
+    if chunk:
+        process(chunk)
+    return deleted
+
+
+def _local_path(field_file):
+    try:
+        return field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return None
+
+
+class ImagePrefetcher:
+    """Downloads files from remote storage to a temporary directory in background threads"""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._temp_dir = None
+        self._counter = itertools.count()
+
+    def _fetch(self, field_file):
+        extension = os.path.splitext(field_file.name)[1]
+        path = os.path.join(self._temp_dir, f'{next(self._counter)}{extension}')
+        storage = field_file.storage
+        if hasattr(storage, 'download'):
+            storage.download(field_file.name, path)
+        else:
+            with storage.open(field_file.name, 'rb') as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        return path
+
+    def submit(self, field_files):
+        """Start fetching; return a future or local path per file"""
+        pending = []
+        for field_file in field_files:
+            path = _local_path(field_file)
+            if path is None:
+                if self._executor is None:
+                    self._temp_dir = tempfile.mkdtemp(prefix='masklens-prefetch-')
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='image-prefetch')
+                pending.append(self._executor.submit(self._fetch, field_file))
+            else:
+                pending.append(path)
+        return pending
+
+    @staticmethod
+    def results(pending):
+        """Wait for submitted files; return the local path or the exception, per file"""
+        paths = []
+        for item in pending:
+            if isinstance(item, str):
+                paths.append(item)
+                continue
+            try:
+                paths.append(item.result())
+            except Exception as e:
+                paths.append(e)
+        return paths
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def local_image_paths(field_files, max_workers=4):
+    """
+    Yield a local path (or the download error) for each file
+
+    Downloaded copies are removed when the block exits.
+    """
+    with ImagePrefetcher(max_workers) as prefetcher:
+        yield prefetcher.results(prefetcher.submit(field_files))
+
+
+def iter_local_batches(field_files, batch_size=16, max_workers=4):
+    """
+    Yield (files, local paths or errors) per batch of `batch_size`
+
+    The next batch is downloading while the caller processes the current
+    one. Downloaded copies are removed when iteration finishes.
+    """
+    field_files = list(field_files)
+    with ImagePrefetcher(max_workers) as prefetcher:
+        batches = [field_files[i:i + batch_size] for i in range(0, len(field_files), batch_size)]
+        pending = prefetcher.submit(batches[0]) if batches else []
+        for index, batch in enumerate(batches):
+            next_pending = prefetcher.submit(batches[index + 1]) if index + 1 < len(batches) else []
+            yield batch, prefetcher.results(pending)
+            pending = next_pending
@@ -0,0 +1,77 @@
+"""
+Weekly summaries
+
+A user's WeeklySummary rows are recomputed by the derived data updaters
+(see events.py) whenever analyses in that week change, so reading the
+summary endpoints only touches FacialAnalysis to compute a summary that
+does not exist yet. Updates lost when a process dies with changes still
+pending, or when an updater fails, are repaired by running the
+rebuild_weekly_summaries command periodically.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import FacialAnalysis, WeeklySummary
+
+
+def week_start_for(day):
+    return day - timedelta(days=day.weekday())
+
+
+def generate_summary(analyses):
+    """Generate weekly summary from analyses"""
+    if not analyses.exists():
+        return {'message': 'No analyses this week'}
+    
+    # Aggregate data from all analyses
+    skin_issues = []
+    scores = []
+    
+    for analysis in analyses:
+        result = analysis.analysis_result
+        if result and 'skin_health' in result:
+            skin_issues.extend(result['skin_health'].values())
+        if result and 'overall_score' in result:
+            scores.append(result['overall_score'])
+    
+    avg_score = sum(scores) / len(scores) if scores else 0
+    
+    return {
+        'total_scans': analyses.count(),
+        'average_score': round(avg_score, 2),
+        'most_common_issues': dict(Counter(skin_issues).most_common(3)),
+        'trend': 'improving' if avg_score > 7 else 'needs_attention'
+    }
+
+
+def update_weekly_summary(user, week_start):
+    """Recompute and save the user's summary for the week starting on `week_start`"""
+    week_end = week_start + timedelta(days=6)
+    analyses = FacialAnalysis.objects.filter(
+        user=user,
+        is_archived=False,
+        created_at__date__gte=week_start,
+        created_at__date__lte=week_end
+    ).only('id', 'analysis_result')
+
+    summary, _ = WeeklySummary.objects.update_or_create(
+        user=user,
+        week_start=week_start,
+        defaults={
+            'week_end': week_end,
+            'total_analyses': analyses.count(),
+            'summary_data': generate_summary(analyses),
+        }
+    )
+    return summary
+
+
+def current_weekly_summary(user):
+    """The user's summary for this week, computed if it does not exist yet"""
+    week_start = week_start_for(timezone.localdate())
+    summary = WeeklySummary.objects.filter(user=user, week_start=week_start).first()
+    if summary is None:
+        summary = update_weekly_summary(user, week_start)
+    return summary
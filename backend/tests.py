@@ -1,3 +1,393 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIClient
+
+from . import events
+from .admission import AdmissionController, ServiceOverloaded
+from .fields import catalog, decode_analysis_result, encode_analysis_result
+from .models import FacialAnalysis, Recommendation, User
+from .storage import ContentAddressedStorage, content_name, delete_unreferenced_files
+from .throttling import MemoryBucketStore
+
+
+RESULT = {
+    'skin_health': {'acne': 'low', 'dark_circles': 'medium', 'hydration': 'good'},
+    'recommendations': ['Get 7-8 hours of sleep', 'Use a gentle cleanser twice daily'],
+    'overall_score': 7.5,
+}
+
+
+class CompactResultTests(TestCase):
+
+    def setUp(self):
+        catalog.reload()
+        self.user = User.objects.create(email='user@example.com')
+
+    def test_round_trip(self):
+        stored = encode_analysis_result(RESULT)
+        self.assertEqual(stored['v'], 1)
+        self.assertEqual(len(stored['r']), 2)
+        self.assertEqual(decode_analysis_result(stored), RESULT)
+
+    def test_model_round_trip(self):
+        analysis = FacialAnalysis.objects.create(user=self.user, image='a.jpg', analysis_result=RESULT)
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.analysis_result, RESULT)
+
+    def test_unknown_values_are_stored_verbatim(self):
+        result = dict(RESULT, skin_health={'freckles': 'low'})
+        self.assertEqual(encode_analysis_result(result), result)
+        result = dict(RESULT, recommendations=['x' * 1000])
+        self.assertEqual(encode_analysis_result(result), result)
+
+    def test_legacy_rows(self):
+        analysis = FacialAnalysis.objects.create(user=self.user, image='a.jpg')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE backend_facialanalysis SET analysis_result = %s WHERE id = %s',
+                [json.dumps(RESULT), analysis.pk]
+            )
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.analysis_result, RESULT)
+
+    def test_missing_catalog_ids_are_skipped(self):
+        stored = encode_analysis_result(RESULT)
+        Recommendation.objects.filter(text='Get 7-8 hours of sleep').delete()
+        catalog.reload()
+        with self.assertLogs('backend.fields', 'WARNING'):
+            result = decode_analysis_result(stored)
+        self.assertEqual(result['recommendations'], ['Use a gentle cleanser twice daily'])
+        # The catalog is only reloaded once per missing ID
+        with self.assertLogs('backend.fields', 'WARNING'), self.assertNumQueries(0):
+            decode_analysis_result(stored)
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_content_name(self):
+        digest = hashlib.sha256(b'face').hexdigest()
+        self.assertEqual(
+            content_name('facial_images/IMG_1.JPG', digest),
+            f'facial_images/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+        second = self.storage.save('facial_images/b.jpg', ContentFile(b'face'))
+        third = self.storage.save('facial_images/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        with self.storage.open(first) as f:
+            self.assertEqual(f.read(), b'face')
+        self.assertEqual(os.listdir(os.path.join(self.location, '.tmp')), [])
+
+    def test_saving_existing_content_refreshes_it(self):
+        name = self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+        old = time.time() - 3600
+        os.utime(self.storage.path(name), (old, old))
+        self.storage.save('facial_images/b.jpg', ContentFile(b'face'))
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), old)
+
+
+class CleanupTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.field = FacialAnalysis._meta.get_field('image')
+        patcher = mock.patch.object(self.field, 'storage', ContentAddressedStorage(location=self.location))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(email='user@example.com')
+
+    def _save(self, content, age):
+        name = self.field.storage.save('facial_images/a.jpg', ContentFile(content))
+        mtime = time.time() - age.total_seconds()
+        os.utime(self.field.storage.path(name), (mtime, mtime))
+        return name
+
+    def test_only_old_unreferenced_files_are_deleted(self):
+        referenced = self._save(b'referenced', timedelta(days=2))
+        FacialAnalysis.objects.create(user=self.user, image=referenced)
+        recent = self._save(b'recent', timedelta(hours=1))
+        unused = self._save(b'unused', timedelta(days=2))
+
+        deleted = delete_unreferenced_files(self.field, 'facial_images', timedelta(hours=24))
+        self.assertEqual(deleted, [unused])
+        self.assertTrue(self.field.storage.exists(referenced))
+        self.assertTrue(self.field.storage.exists(recent))
+        self.assertFalse(self.field.storage.exists(unused))
+
+    def test_upload_during_cleanup_keeps_the_file(self):
+        name = self._save(b'face', timedelta(days=2))
+        storage = self.field.storage
+        delete_if_unused = storage.delete_if_unused
+
+        def upload_then_delete(name, is_unused):
+            # The same content is uploaded and committed right before the delete
+            FacialAnalysis.objects.create(
+                user=self.user, image=storage.save('facial_images/b.jpg', ContentFile(b'face'))
+            )
+            return delete_if_unused(name, is_unused)
+
+        with mock.patch.object(storage, 'delete_if_unused', upload_then_delete):
+            self.assertEqual(delete_unreferenced_files(self.field, 'facial_images', timedelta(hours=24)), [])
+        self.assertTrue(storage.exists(name))
+
+
+@skipUnless(importlib.util.find_spec('moto'), 'moto is not installed')
+class S3StorageTests(TestCase):
+
+    def setUp(self):
+        import boto3
+        from moto import mock_aws
+
+        from .storage import S3Storage
+
+        mocked = mock_aws()
+        mocked.start()
+        self.addCleanup(mocked.stop)
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='masklens-test')
+        self.storage = S3Storage(
+            bucket_name='masklens-test', region_name='us-east-1',
+            access_key='testing', secret_key='testing', location='media'
+        )
+
+    def test_save_and_dedupe(self):
+        first = self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+        second = self.storage.save('facial_images/b.jpg', ContentFile(b'face'))
+        self.assertEqual(first, second)
+        self.assertEqual(first, content_name('facial_images/a.jpg', hashlib.sha256(b'face').hexdigest()))
+        self.assertTrue(self.storage.exists(first))
+        with self.storage.open(first) as f:
+            self.assertEqual(f.read(), b'face')
+
+    def test_listdir(self):
+        name = self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+        directories, files = self.storage.listdir('facial_images')
+        self.assertEqual(directories, [name.split('/')[1]])
+        self.assertEqual(files, [])
+        directories, files = self.storage.listdir(os.path.dirname(name))
+        self.assertEqual(files, [os.path.basename(name)])
+
+    def test_prefetch(self):
+        from .storage import local_image_paths
+
+        user = User.objects.create(email='user@example.com')
+        field = FacialAnalysis._meta.get_field('image')
+        with mock.patch.object(field, 'storage', self.storage):
+            analysis = FacialAnalysis.objects.create(
+                user=user, image=self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+            )
+            with local_image_paths([analysis.image]) as paths:
+                with open(paths[0], 'rb') as f:
+                    self.assertEqual(f.read(), b'face')
+
+    def test_object_deleted_before_refresh_is_uploaded_again(self):
+        name = self.storage.save('facial_images/a.jpg', ContentFile(b'face'))
+        head = self.storage._head
+
+        def head_then_cleanup(key):
+            response = head(key)
+            self.storage.delete(key)
+            return response
+
+        with mock.patch.object(self.storage, '_head', head_then_cleanup):
+            self.storage.save('facial_images/b.jpg', ContentFile(b'face'))
+        self.assertTrue(self.storage.exists(name))
+
+
+class AdmissionTests(SimpleTestCase):
+
+    def _hold(self, controller, user_id, release):
+        admitted = threading.Event()
+
+        def run():
+            with controller.admit(user_id):
+                admitted.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(admitted.wait(5))
+        return thread
+
+    def _admit_once(self, controller, user_id):
+        with controller.admit(user_id):
+            pass
+
+    def test_queued_request_runs_when_a_slot_frees(self):
+        controller = AdmissionController(max_in_flight=1, queue_timeout=5)
+        release = threading.Event()
+        holder = self._hold(controller, 1, release)
+
+        threading.Timer(0.1, release.set).start()
+        with controller.admit(2):
+            self.assertEqual(controller.metrics()['in_flight'], 1)
+        holder.join()
+        self.assertEqual(controller.metrics()['admitted'], 2)
+
+    def test_queue_timeout_is_shed(self):
+        controller = AdmissionController(max_in_flight=1, queue_timeout=0.05)
+        release = threading.Event()
+        holder = self._hold(controller, 1, release)
+        with self.assertLogs('backend.admission', 'WARNING'), self.assertRaises(ServiceOverloaded) as cm:
+            with controller.admit(2):
+                pass
+        release.set()
+        holder.join()
+        self.assertGreaterEqual(cm.exception.wait, 1)
+        self.assertEqual(controller.metrics()['shed'], {'queue_timeout': 1})
+        self.assertEqual(controller.metrics()['waiting'], 0)
+
+    def test_full_queue_is_shed(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        release = threading.Event()
+        holder = self._hold(controller, 1, release)
+        with self.assertLogs('backend.admission', 'WARNING'), self.assertRaises(ServiceOverloaded):
+            with controller.admit(2):
+                pass
+        release.set()
+        holder.join()
+        self.assertEqual(controller.metrics()['shed'], {'queue_full': 1})
+
+    def test_queued_requests_count_towards_the_user_limit(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=8, queue_timeout=5, max_per_user=2)
+        release = threading.Event()
+        holder = self._hold(controller, 1, release)
+
+        queued = threading.Thread(target=self._admit_once, args=(controller, 1))
+        queued.start()
+        while controller.metrics()['waiting'] == 0:
+            time.sleep(0.01)
+        with self.assertLogs('backend.admission', 'WARNING'), self.assertRaises(Throttled):
+            with controller.admit(1):
+                pass
+        release.set()
+        holder.join()
+        queued.join()
+        self.assertEqual(controller.metrics()['shed'], {'user_concurrency': 1})
+
+    def test_latency_is_averaged_per_image(self):
+        controller = AdmissionController(max_in_flight=4)
+        with mock.patch('backend.admission.time.monotonic', side_effect=[0.0, 1.0]):
+            with controller.admit(1, units=10):
+                self.assertEqual(controller.metrics()['in_flight'], 4)
+        self.assertEqual(controller.metrics()['latency_ewma_seconds'], 0.1)
+
+
+class ThrottlingTests(TestCase):
+
+    def test_bucket_refills(self):
+        store = MemoryBucketStore()
+        with mock.patch('backend.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(store.take('k', 2, 1.0), 0)
+            self.assertEqual(store.take('k', 2, 1.0), 0)
+            self.assertEqual(store.take('k', 2, 1.0), 1.0)
+        with mock.patch('backend.throttling.time.monotonic', return_value=100.5):
+            self.assertEqual(store.take('k', 2, 1.0), 0.5)
+        with mock.patch('backend.throttling.time.monotonic', return_value=101.0):
+            self.assertEqual(store.take('k', 2, 1.0), 0)
+
+    def test_cost(self):
+        store = MemoryBucketStore()
+        with mock.patch('backend.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(store.take('k', 10, 1.0, cost=8), 0)
+            self.assertEqual(store.take('k', 10, 1.0, cost=3), 1.0)
+            self.assertEqual(store.take('k', 10, 1.0, cost=2), 0)
+
+    def test_least_recently_used_bucket_is_evicted(self):
+        store = MemoryBucketStore(max_entries=2)
+        store.take('a', 1, 1.0)
+        store.take('b', 1, 1.0)
+        store.take('a', 1, 1.0)
+        store.take('c', 1, 1.0)
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+
+    def test_login_is_throttled(self):
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework['DEFAULT_THROTTLE_RATES'] = dict(rest_framework['DEFAULT_THROTTLE_RATES'], auth='2/min')
+        with override_settings(REST_FRAMEWORK=rest_framework, MASKLENS_THROTTLE={'STORE': 'memory'}):
+            client = APIClient()
+            credentials = {'email': 'nobody@example.com', 'password': 'wrong'}
+            for _ in range(2):
+                self.assertEqual(client.post('/api/auth/login/', credentials).status_code, 400)
+            # A spoofed X-Forwarded-For does not get a new bucket
+            response = client.post('/api/auth/login/', credentials, HTTP_X_FORWARDED_FOR='10.0.0.1')
+            self.assertEqual(response.status_code, 429)
+            self.assertIn(int(response['Retry-After']), range(1, 31))
+
+
+@override_settings(MASKLENS_EVENTS={'DEBOUNCE': 0.0})
+class EventBusTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='user@example.com')
+        self.other = User.objects.create(email='other@example.com')
+        self.calls = []
+        self.bus = events.EventBus()
+        self.bus.register(lambda user_id, changes: self.calls.append((user_id, changes)))
+
+    def _analysis(self, pk, user):
+        return FacialAnalysis(pk=pk, user=user, created_at=timezone.now())
+
+    def test_one_dispatch_per_user_per_coalesce(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.bus.coalesce():
+                self.bus.publish('created', [self._analysis(1, self.user), self._analysis(2, self.user)])
+                self.bus.publish('created', [self._analysis(3, self.other)])
+                self.bus.publish('updated', [self._analysis(1, self.user)])
+        self.assertEqual(sorted(user_id for user_id, _ in self.calls), [self.user.pk, self.other.pk])
+        changes = dict(self.calls)[self.user.pk]
+        self.assertEqual(sorted(changes.created), [1, 2])
+        self.assertFalse(changes.rebuild)
+
+    def test_created_and_deleted_cancel_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.bus.coalesce():
+                self.bus.publish('created', [self._analysis(1, self.user)])
+                self.bus.publish('deleted', [self._analysis(1, self.user)])
+        (user_id, changes), = self.calls
+        self.assertEqual(changes.created, {})
+        self.assertFalse(changes.rebuild)
+
+    def test_deleting_an_existing_analysis_rebuilds(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bus.publish('deleted', [self._analysis(1, self.user)])
+        (user_id, changes), = self.calls
+        self.assertTrue(changes.rebuild)
+
+    def test_nothing_is_dispatched_without_a_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with self.bus.coalesce():
+                self.bus.publish('created', [self._analysis(1, self.user)])
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_saves_update_weekly_summary_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with events.coalesce():
+                for name in ('a.jpg', 'b.jpg'):
+                    FacialAnalysis.objects.create(user=self.user, image=name, analysis_result=RESULT)
+        summary = self.user.weekly_summaries.get()
+        self.assertEqual(summary.total_analyses, 2)
@@ -0,0 +1,163 @@
+"""
+Token bucket rate limiting
+
+Each (scope, user or IP) pair gets a bucket holding up to N tokens that
+refills at N per period, where the rate for a scope comes from
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] ('N/period', e.g. '10/min') and
+the scope from the view's `throttle_scope`. Client IPs come from
+REMOTE_ADDR, or from X-Forwarded-For only as far as
+REST_FRAMEWORK['NUM_PROXIES'] trusted proxies. A request takes one token,
+or as many as the view's get_throttle_cost(request) returns (e.g. one per
+image of a batch upload, capped at N); bursts of up to N tokens pass, then
+requests are rejected with 429 and a Retry-After of the time until enough
+tokens are available.
+
+Buckets live in the store selected by MASKLENS_THROTTLE['STORE']:
+
+- 'memory': an LRU dict in this process (single-process deployments),
+  bounded to max_entries buckets. A check is a lock, a dict lookup and a
+  few float operations.
+- 'cache': a Django cache (MASKLENS_THROTTLE['CACHE_ALIAS']) shared by all
+  workers, e.g. FileBasedCache on one host or Memcached/Redis.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Return (capacity, tokens per second) for a rate like '10/min'"""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class MemoryBucketStore:
+    max_entries = 100000
+
+    def __init__(self, max_entries=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, refill_rate, cost=1):
+        """Take `cost` tokens; return 0 if allowed, else seconds until they are available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(self._buckets) >= self.max_entries:
+                    # Drop the least recently used bucket
+                    self._buckets.popitem(last=False)
+            else:
+                tokens, updated = bucket
+                tokens = min(capacity, tokens + (now - updated) * refill_rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / refill_rate
+
+
+class CacheBucketStore:
+    """
+    Buckets in a shared Django cache
+
+    The read-modify-write is not atomic across processes, so concurrent
+    requests for the same key may occasionally both get the last token.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, refill_rate, cost=1):
+        now = time.time()
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+        timeout = int(capacity / refill_rate) + 1
+        if tokens >= cost:
+            self.cache.set(key, (tokens - cost, now), timeout)
+            return 0
+        self.cache.set(key, (tokens, now), timeout)
+        return (cost - tokens) / refill_rate
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        options = getattr(settings, 'MASKLENS_THROTTLE', {})
+        name = options.get('STORE', 'memory')
+        if name == 'memory':
+            _store = MemoryBucketStore()
+        elif name == 'cache':
+            _store = CacheBucketStore(options.get('CACHE_ALIAS', 'default'))
+        else:
+            raise ImproperlyConfigured(f'Unknown throttle store: {name}')
+    return _store
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting in ('MASKLENS_THROTTLE', 'CACHES'):
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        cost = 1
+        if hasattr(view, 'get_throttle_cost'):
+            # A request costing more than the bucket holds could never pass
+            cost = min(max(1, view.get_throttle_cost(request)), capacity)
+        key = f'throttle:{scope}:{self.get_ident_key(request)}'
+        self._wait = get_store().take(key, capacity, refill_rate, cost)
+        return self._wait == 0
+
+    def wait(self):
+        # Retry-After is sent in whole seconds; never round a wait down to 0
+        return math.ceil(self._wait)
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Bucket per client IP - for unauthenticated endpoints like login"""
+
+    def get_ident_key(self, request):
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Bucket per authenticated user, falling back to the client IP"""
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
@@ -0,0 +1,176 @@
+"""
+Time-series rollups of analysis scores and skin metrics
+
+Every new analysis is added to its day, week and month AnalysisRollup rows,
+so trend charts read a handful of pre-aggregated rows instead of every
+FacialAnalysis. Skin metric levels are mapped to numbers (LEVEL_SCORES)
+to be averaged.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .fields import METRIC_CODES
+from .models import AnalysisRollup, FacialAnalysis
+
+
+PERIODS = ('day', 'week', 'month')
+
+SCORE_METRIC = 'overall_score'
+
+SERIES_METRICS = (SCORE_METRIC,) + METRIC_CODES
+
+LEVEL_SCORES = {
+    'low': 1,
+    'medium': 2,
+    'high': 3,
+    'poor': 1,
+    'fair': 2,
+    'good': 3,
+    'excellent': 4,
+}
+
+
+def bucket_start(day, period):
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unknown period: {period}')
+
+
+def _contribution(result):
+    """Return (score, {metric: level score}) for one analysis result"""
+    result = result or {}
+    score = result.get(SCORE_METRIC)
+    if not isinstance(score, (int, float)):
+        score = None
+    metrics = {
+        metric: LEVEL_SCORES[level]
+        for metric, level in result.get('skin_health', {}).items()
+        if level in LEVEL_SCORES
+    }
+    return score, metrics
+
+
+def _apply(rollup, score, metrics):
+    rollup.total_analyses += 1
+    if score is not None:
+        rollup.score_sum += score
+        rollup.score_count += 1
+    for metric, value in metrics.items():
+        rollup.metric_sums[metric] = rollup.metric_sums.get(metric, 0) + value
+        rollup.metric_counts[metric] = rollup.metric_counts.get(metric, 0) + 1
+
+
+def _locked_rollup(user_id, period, start):
+    try:
+        with transaction.atomic():
+            rollup, _ = AnalysisRollup.objects.select_for_update().get_or_create(
+                user_id=user_id, period=period, bucket_start=start
+            )
+    except IntegrityError:
+        # Created concurrently by another request
+        rollup = AnalysisRollup.objects.select_for_update().get(
+            user_id=user_id, period=period, bucket_start=start
+        )
+    return rollup
+
+
+def record_analyses(analyses):
+    """Add newly created analyses to their day/week/month rollups"""
+    grouped = {}
+    for analysis in analyses:
+        day = timezone.localdate(analysis.created_at)
+        contribution = _contribution(analysis.analysis_result)
+        for period in PERIODS:
+            key = (analysis.user_id, period, bucket_start(day, period))
+            grouped.setdefault(key, []).append(contribution)
+
+    with transaction.atomic():
+        for (user_id, period, start), contributions in grouped.items():
+            rollup = _locked_rollup(user_id, period, start)
+            for score, metrics in contributions:
+                _apply(rollup, score, metrics)
+            rollup.save()
+
+
+def record_analysis(analysis):
+    record_analyses([analysis])
+
+
+def rebuild_rollups(user):
+    """Recompute all of a user's rollups from their analyses"""
+    rollups = {}
+    analyses = (
+        FacialAnalysis.objects.filter(user=user, is_archived=False)
+        .only('id', 'user_id', 'created_at', 'analysis_result')
+        .iterator(chunk_size=2000)
+    )
+    for analysis in analyses:
+        day = timezone.localdate(analysis.created_at)
+        score, metrics = _contribution(analysis.analysis_result)
+        for period in PERIODS:
+            start = bucket_start(day, period)
+            rollup = rollups.get((period, start))
+            if rollup is None:
+                rollup = rollups[(period, start)] = AnalysisRollup(
+                    user=user, period=period, bucket_start=start
+                )
+            _apply(rollup, score, metrics)
+
+    with transaction.atomic():
+        AnalysisRollup.objects.filter(user=user).delete()
+        AnalysisRollup.objects.bulk_create(rollups.values())
+
+
+def _value(row, metric):
+    if metric == SCORE_METRIC:
+        total, count = row['score_sum'], row['score_count']
+    else:
+        total, count = row['metric_sums'].get(metric), row['metric_counts'].get(metric)
+    if not count:
+        return None
+    return round(total / count, 2)
+
+
+def get_series(user, period, metrics, start=None, end=None, limit=None, window=1):
+    """
+    Return {metric: [point, ...]} for the user's buckets, oldest first
+
+    Each point has the bucket start, the number of analyses in the bucket,
+    the bucket's mean value and the mean of the last `window` values.
+    """
+    queryset = AnalysisRollup.objects.filter(user=user, period=period)
+    if start is not None:
+        queryset = queryset.filter(bucket_start__gte=bucket_start(start, period))
+    if end is not None:
+        queryset = queryset.filter(bucket_start__lte=end)
+
+    fields = ('bucket_start', 'total_analyses', 'score_sum', 'score_count', 'metric_sums', 'metric_counts')
+    if limit is not None:
+        rows = list(queryset.order_by('-bucket_start').values(*fields)[:limit])
+        rows.reverse()
+    else:
+        rows = list(queryset.order_by('bucket_start').values(*fields))
+
+    series = {}
+    for metric in metrics:
+        points = []
+        recent = []
+        for row in rows:
+            value = _value(row, metric)
+            if value is not None:
+                recent.append(value)
+                recent = recent[-window:]
+            points.append({
+                'bucket_start': row['bucket_start'].isoformat(),
+                'count': row['total_analyses'],
+                'value': value,
+                'moving_average': round(sum(recent) / len(recent), 2) if recent else None,
+            })
+        series[metric] = points
+    return series
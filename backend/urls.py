@@ -5,10 +5,14 @@ from .views import (
     LoginView,
     UserProfileView,
     FacialAnalysisCreateView,
+    FacialAnalysisBatchCreateView,
     FacialAnalysisListView,
     FacialAnalysisDetailView,
+    FacialAnalysisExportView,
+    AnalysisTrendView,
     WeeklySummaryView,
-    WeeklySummaryListView
+    WeeklySummaryListView,
+    AdmissionMetricsView
 )
 
 urlpatterns = [
@@ -22,10 +26,16 @@ urlpatterns = [
     
     # Facial Analysis
     path('analysis/', FacialAnalysisCreateView.as_view(), name='analysis_create'),
+    path('analysis/batch/', FacialAnalysisBatchCreateView.as_view(), name='analysis_batch_create'),
     path('analysis/list/', FacialAnalysisListView.as_view(), name='analysis_list'),
     path('analysis/<int:pk>/', FacialAnalysisDetailView.as_view(), name='analysis_detail'),
+    path('analysis/trends/', AnalysisTrendView.as_view(), name='analysis_trends'),
+    path('analysis/export/<str:export_format>/', FacialAnalysisExportView.as_view(), name='analysis_export'),
     
     # Weekly Summary
     path('summary/weekly/', WeeklySummaryView.as_view(), name='weekly_summary'),
     path('summary/history/', WeeklySummaryListView.as_view(), name='summary_history'),
+
+    # Operations
+    path('metrics/admission/', AdmissionMetricsView.as_view(), name='admission_metrics'),
 ]
@@ -2,21 +2,30 @@ from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
-from datetime import timedelta
-from collections import Counter
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from .models import User, FacialAnalysis, WeeklySummary
+from . import events, exports, response_cache, summaries, trends
+from .admission import get_controller
+from .throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
+from .inference import NoFaceDetected, analyze_face, analyze_faces, detect_face
+from .storage import local_image_paths
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
     UserSerializer,
     FacialAnalysisSerializer,
-    WeeklySummarySerializer
+    FacialAnalysisListSerializer,
+    TrendQuerySerializer,
+    WeeklySummarySerializer,
+    WeeklySummaryListSerializer
 )
 
 
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'auth'
     
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
@@ -35,6 +44,8 @@ class RegisterView(APIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'auth'
     
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
@@ -61,66 +72,168 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
 class FacialAnalysisCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle]
+    throttle_scope = 'analysis_upload'
     
     def post(self, request):
         serializer = FacialAnalysisSerializer(data=request.data)
         if serializer.is_valid():
-            # Save the image first
-            analysis = serializer.save(user=request.user)
+            # Sheds the request with 429/503 when inference is saturated;
+            # derived data is updated once, for the final result
+            with get_controller().admit(request.user.pk), events.coalesce():
+                return self._create(request, serializer)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _create(self, request, serializer):
+        # Reject photos without a face before storing or analyzing them
+        try:
+            face_box = detect_face(serializer.validated_data['image'])
+        except NoFaceDetected as e:
+            return Response({'image': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {'error': f'Face detection failed: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # Save the image first
+        analysis = serializer.save(user=request.user, face_box=face_box)
+        
+        # Run facial analysis
+        try:
+            # Uses the backend configured in MASKLENS_INFERENCE; images in
+            # remote storage are downloaded to a temporary file first
+            with local_image_paths([analysis.image]) as (image_path,):
+                if isinstance(image_path, Exception):
+                    raise image_path
+                analysis_result = analyze_face(image_path, analysis.face_box)
             
-            # Run facial analysis
+            analysis.analysis_result = analysis_result
+            analysis.save()
+            
+            return Response(
+                FacialAnalysisSerializer(analysis).data,
+                status=status.HTTP_201_CREATED
+            )
+        except Exception as e:
+            # If analysis fails, delete the saved image and return error
+            analysis.delete()
+            return Response(
+                {'error': f'Analysis failed: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class FacialAnalysisBatchCreateView(APIView):
+    """
+    Upload several images (multipart field `images`) in one request
+
+    Images are validated (including face detection) one by one, stored
+    with a single bulk_create and analyzed as one batch. Each image gets
+    its own entry in `results`, so a bad image is reported without failing
+    the others.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle]
+    throttle_scope = 'analysis_upload'
+    max_images = 10
+
+    def get_throttle_cost(self, request):
+        # One upload token per image, like the single-image endpoint
+        return min(len(request.FILES.getlist('images')), self.max_images)
+
+    def post(self, request):
+        files = request.FILES.getlist('images')
+        if not files:
+            return Response({'images': ['No files were submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        if len(files) > self.max_images:
+            return Response(
+                {'images': [f'At most {self.max_images} images can be uploaded per request.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with get_controller().admit(request.user.pk, units=len(files)), events.coalesce():
+            return self._create(request, files)
+
+    def _create(self, request, files):
+        results = [{'index': index, 'filename': f.name} for index, f in enumerate(files)]
+
+        pending = []
+        for index, f in enumerate(files):
+            serializer = FacialAnalysisSerializer(data={'image': f})
+            if not serializer.is_valid():
+                results[index].update(status='invalid', errors=serializer.errors)
+                continue
             try:
-                # TODO: Uncomment this when you add your ML model
-                # from .ml_model import analyze_face
-                # analysis_result = analyze_face(analysis.image.path)
-                
-                # For now, using mock data
-                analysis_result = self._mock_facial_analysis(analysis.image.path)
-                
-                analysis.analysis_result = analysis_result
-                analysis.save()
-                
-                return Response(
-                    FacialAnalysisSerializer(analysis).data,
-                    status=status.HTTP_201_CREATED
-                )
+                face_box = detect_face(serializer.validated_data['image'])
+            except NoFaceDetected as e:
+                results[index].update(status='invalid', errors={'image': [str(e)]})
+                continue
             except Exception as e:
-                # If analysis fails, delete the saved image and return error
-                analysis.delete()
-                return Response(
-                    {'error': f'Analysis failed: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                # Only this image fails, not the whole batch
+                results[index].update(status='failed', error=f'Face detection failed: {e}')
+                continue
+            pending.append((index, FacialAnalysis(
+                user=request.user, face_box=face_box, **serializer.validated_data
+            )))
+
+        if pending:
+            with transaction.atomic():
+                FacialAnalysis.objects.bulk_create([analysis for _, analysis in pending])
+            # bulk_create and bulk_update send no signals
+            events.publish('created', [analysis for _, analysis in pending])
+
+            with local_image_paths([analysis.image for _, analysis in pending]) as image_paths:
+                # Images that could not be fetched keep the error as their result
+                analysis_results = analyze_faces(
+                    image_paths, [analysis.face_box for _, analysis in pending]
                 )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _mock_facial_analysis(self, image_path):
-        """
-        Mock analysis result - replace with actual ML model
-        
-        To integrate your model:
-        1. Create backend/ml_model.py with an analyze_face(image_path) function
-        2. Uncomment the import and function call above
-        3. Remove this mock function
-        """
-        return {
-            'skin_health': {
-                'acne': 'low',
-                'dark_circles': 'medium',
-                'wrinkles': 'low',
-                'hydration': 'good',
-                'redness': 'low',
-                'pores': 'medium'
-            },
-            'recommendations': [
-                'Use a gentle cleanser twice daily',
-                'Apply moisturizer with SPF 30+',
-                'Get 7-8 hours of sleep',
-                'Stay hydrated',
-                'Use an eye cream for dark circles'
-            ],
-            'overall_score': 7.5,
-            'confidence': 0.85
-        }
+
+            succeeded = []
+            failed = []
+            for (index, analysis), result in zip(pending, analysis_results):
+                if isinstance(result, Exception):
+                    failed.append(analysis)
+                    results[index].update(status='failed', error=f'Analysis failed: {result}')
+                else:
+                    analysis.analysis_result = result
+                    succeeded.append((index, analysis))
+
+            FacialAnalysis.objects.bulk_update([analysis for _, analysis in succeeded], ['analysis_result'])
+            events.publish('updated', [analysis for _, analysis in succeeded])
+
+            if failed:
+                # Same cleanup as the single upload: drop the record. Images
+                # may be shared by identical uploads, so unreferenced files
+                # are removed later by cleanup_media_files
+                FacialAnalysis.objects.filter(pk__in=[analysis.pk for analysis in failed]).delete()
+
+            context = {'request': request}
+            for index, analysis in succeeded:
+                results[index].update(
+                    status='created',
+                    analysis=FacialAnalysisSerializer(analysis, context=context).data
+                )
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        elif any(result['status'] == 'failed' for result in results):
+            response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response({'created': created, 'results': results}, status=response_status)
+
+
+class AdmissionMetricsView(APIView):
+    """In-flight, queued, admitted and shed analysis requests for this worker"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_controller().metrics())
 
 
 class FacialAnalysisListView(generics.ListAPIView):
@@ -128,7 +241,13 @@ class FacialAnalysisListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return FacialAnalysis.objects.filter(user=self.request.user)
+        return FacialAnalysis.objects.filter(user=self.request.user, is_archived=False)
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            queryset = self.filter_queryset(self.get_queryset())
+            return FacialAnalysisListSerializer(queryset, context=self.get_serializer_context()).data
+        return Response(response_cache.cached_list(request, 'analyses', build))
 
 
 class FacialAnalysisDetailView(generics.RetrieveAPIView):
@@ -136,66 +255,81 @@ class FacialAnalysisDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return FacialAnalysis.objects.filter(user=self.request.user)
+        return FacialAnalysis.objects.filter(user=self.request.user, is_archived=False)
+
+
+class FacialAnalysisExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def get(self, request, export_format):
+        if export_format not in self.content_types:
+            return Response(
+                {'error': f'Unsupported export format: {export_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = exports.export_queryset(request.user)
+        context = {'request': request}
+
+        if request.query_params.get('thumbnails') in ('1', 'true'):
+            chunks = exports.iter_zip(queryset, context, export_format)
+            response = StreamingHttpResponse(
+                (chunk for chunk in chunks if chunk),
+                content_type='application/zip'
+            )
+            filename = 'analyses.zip'
+        else:
+            if export_format == 'ndjson':
+                chunks = exports.iter_ndjson(queryset, context)
+            else:
+                chunks = exports.iter_csv(queryset, context)
+            response = StreamingHttpResponse(chunks, content_type=self.content_types[export_format])
+            filename = f'analyses.{export_format}'
+
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class AnalysisTrendView(APIView):
+    """Pre-aggregated score and skin metric series per day, week or month"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        serializer = TrendQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+
+        # Without an explicit range, return the most recent `limit` buckets
+        limit = None if 'start' in params else params['limit']
+        series = trends.get_series(
+            request.user,
+            params['period'],
+            params['metrics'],
+            start=params.get('start'),
+            end=params.get('end'),
+            limit=limit,
+            window=params['window']
+        )
+        return Response({
+            'period': params['period'],
+            'window': params['window'],
+            'series': series
+        })
 
 
 class WeeklySummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        # Get current week
-        today = timezone.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
-        
-        # Get or create weekly summary
-        summary, created = WeeklySummary.objects.get_or_create(
-            user=request.user,
-            week_start=week_start,
-            defaults={
-                'week_end': week_end,
-                'total_analyses': 0,
-                'summary_data': {}
-            }
-        )
-        
-        # Update summary with latest data
-        analyses = FacialAnalysis.objects.filter(
-            user=request.user,
-            created_at__gte=week_start,
-            created_at__lte=week_end
-        )
-        
-        summary.total_analyses = analyses.count()
-        summary.summary_data = self._generate_summary(analyses)
-        summary.save()
-        
+        # Kept up to date by the derived data updaters (see events.py)
+        summary = summaries.current_weekly_summary(request.user)
         return Response(WeeklySummarySerializer(summary).data)
-    
-    def _generate_summary(self, analyses):
-        """Generate weekly summary from analyses"""
-        if not analyses.exists():
-            return {'message': 'No analyses this week'}
-        
-        # Aggregate data from all analyses
-        skin_issues = []
-        scores = []
-        
-        for analysis in analyses:
-            result = analysis.analysis_result
-            if result and 'skin_health' in result:
-                skin_issues.extend(result['skin_health'].values())
-            if result and 'overall_score' in result:
-                scores.append(result['overall_score'])
-        
-        avg_score = sum(scores) / len(scores) if scores else 0
-        
-        return {
-            'total_scans': analyses.count(),
-            'average_score': round(avg_score, 2),
-            'most_common_issues': dict(Counter(skin_issues).most_common(3)),
-            'trend': 'improving' if avg_score > 7 else 'needs_attention'
-        }
 
 
 class WeeklySummaryListView(generics.ListAPIView):
@@ -204,3 +338,9 @@ class WeeklySummaryListView(generics.ListAPIView):
     
     def get_queryset(self):
         return WeeklySummary.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            queryset = self.filter_queryset(self.get_queryset())
+            return WeeklySummaryListSerializer(queryset, context=self.get_serializer_context()).data
+        return Response(response_cache.cached_list(request, 'summaries', build))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -137,6 +138,27 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # FastJSONRenderer uses orjson when installed and falls back to the stdlib
+    'DEFAULT_RENDERER_CLASSES': (
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Number of trusted reverse proxies in front of the app; client IPs for
+    # throttling are read from X-Forwarded-For only that far
+    'NUM_PROXIES': int(os.environ.get('MASKLENS_NUM_PROXIES', 0)),
+    # Token bucket rates per throttle_scope, see backend/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '10/min',
+        'analysis_upload': '30/min',
+    },
+}
+
+# Rate Limiting Store
+# 'memory' keeps buckets per process; 'cache' shares them between workers
+# through the CACHES alias below (e.g. a FileBasedCache or Memcached)
+MASKLENS_THROTTLE = {
+    'STORE': os.environ.get('MASKLENS_THROTTLE_STORE', 'memory'),
+    'CACHE_ALIAS': 'default',
 }
 
 # JWT Configuration
@@ -161,3 +183,91 @@ CORS_ALLOW_CREDENTIALS = True
 # Media Files Configuration
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Media Storage
+# Uploads are stored content-addressed in hash-prefix directories (see
+# backend/storage.py). MASKLENS_STORAGE='s3' stores them in an S3-compatible
+# bucket instead (requires boto3); set MASKLENS_S3_ENDPOINT_URL for a local
+# stand-in such as MinIO.
+MEDIA_STORAGES = {
+    'local': {
+        'BACKEND': 'backend.storage.ContentAddressedStorage',
+    },
+    's3': {
+        'BACKEND': 'backend.storage.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ.get('MASKLENS_S3_BUCKET', 'masklens-media'),
+            'endpoint_url': os.environ.get('MASKLENS_S3_ENDPOINT_URL'),
+            'region_name': os.environ.get('MASKLENS_S3_REGION'),
+            'access_key': os.environ.get('MASKLENS_S3_ACCESS_KEY'),
+            'secret_key': os.environ.get('MASKLENS_S3_SECRET_KEY'),
+            'location': os.environ.get('MASKLENS_S3_LOCATION', 'media'),
+            'base_url': os.environ.get('MASKLENS_S3_BASE_URL'),
+        },
+    },
+}
+
+STORAGES = {
+    'default': MEDIA_STORAGES[os.environ.get('MASKLENS_STORAGE', 'local')],
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Inference Configuration
+# BACKEND: 'auto' (backend/ml_model.py if present, else mock), 'mock',
+# 'ml_model', 'onnx', 'torchscript' or 'remote' (the inference server started
+# with `manage.py run_inference_server`, which runs SERVER_BACKEND in
+# SERVER_WORKERS processes). Thread counts apply per process running the
+# model; keep intra * processes <= CPU cores.
+MASKLENS_INFERENCE = {
+    'BACKEND': os.environ.get('MASKLENS_INFERENCE_BACKEND', 'auto'),
+    'MODEL_PATH': BASE_DIR / 'backend' / 'models' / 'facial_analysis.onnx',
+    'QUANTIZED_MODEL_PATH': BASE_DIR / 'backend' / 'models' / 'facial_analysis.int8.onnx',
+    'USE_QUANTIZED': os.environ.get('MASKLENS_USE_QUANTIZED', '0') == '1',
+    'INPUT_SIZE': 224,
+    'INTRA_OP_THREADS': int(os.environ.get('MASKLENS_INTRA_OP_THREADS', 1)),
+    'INTER_OP_THREADS': int(os.environ.get('MASKLENS_INTER_OP_THREADS', 1)),
+    'SOCKET_PATH': os.environ.get('MASKLENS_INFERENCE_SOCKET', '/tmp/masklens-inference.sock'),
+    'SERVER_BACKEND': os.environ.get('MASKLENS_SERVER_BACKEND', 'onnx'),
+    'SERVER_WORKERS': int(os.environ.get('MASKLENS_SERVER_WORKERS', 1)),
+    'TIMEOUT': 30,
+    # 'auto' uses the OpenCV Haar cascade when opencv is installed, 'haar'
+    # requires it, 'none' analyzes the whole image
+    'FACE_DETECTOR': os.environ.get('MASKLENS_FACE_DETECTOR', 'auto'),
+    'FACE_MARGIN': 0.2,
+}
+
+# Admission Control (per web worker process)
+# MAX_IN_FLIGHT images analyzed at once, up to MAX_QUEUE requests waiting at
+# most QUEUE_TIMEOUT seconds, MAX_PER_USER concurrent requests per user, and
+# queued requests shed while the average latency per image exceeds
+# LATENCY_TARGET seconds.
+MASKLENS_ADMISSION = {
+    'MAX_IN_FLIGHT': int(os.environ.get('MASKLENS_MAX_IN_FLIGHT', 4)),
+    'MAX_QUEUE': int(os.environ.get('MASKLENS_MAX_QUEUE', 8)),
+    'QUEUE_TIMEOUT': 5.0,
+    'MAX_PER_USER': 2,
+    'LATENCY_TARGET': 10.0,
+}
+
+# Worker Startup
+# 'none', 'imports' or 'model' - what wsgi.py loads before the server forks
+# workers (e.g. gunicorn --preload), see backend/preload.py
+MASKLENS_PRELOAD = os.environ.get('MASKLENS_PRELOAD', 'none')
+
+# Derived Data Updates
+# Weekly summaries, trend rollups and cached lists are updated once per user
+# when a transaction changing analyses commits. DEBOUNCE > 0 waits that many
+# seconds to merge bursts across requests, then updates in a background thread.
+MASKLENS_EVENTS = {
+    'DEBOUNCE': float(os.environ.get('MASKLENS_EVENTS_DEBOUNCE', 0)),
+}
+
+# List Response Cache
+# Seconds to cache /api/analysis/list/ and /api/summary/history/ per user
+# (0 disables). With several workers, point CACHE_ALIAS at a shared cache.
+MASKLENS_LIST_CACHE = {
+    'TIMEOUT': int(os.environ.get('MASKLENS_LIST_CACHE_TIMEOUT', 0)),
+    'CACHE_ALIAS': 'default',
+}
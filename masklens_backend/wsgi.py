@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'masklens_backend.settings')
 
 application = get_wsgi_application()
+
+# Preload-then-fork: see backend/preload.py
+from django.conf import settings
+
+if settings.MASKLENS_PRELOAD in ('imports', 'model'):
+    from backend.preload import preload
+
+    preload(settings.MASKLENS_PRELOAD)